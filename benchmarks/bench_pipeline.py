@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+benchmarks of the stages of the dashboard update, on offline fixture data
+(see conftest.py); needs pytest-benchmark:
+
+    pip install pytest-benchmark
+    pytest benchmarks/bench_pipeline.py --benchmark-autosave
+
+peak memory (tracemalloc) of each stage is in the extra info of the results,
+and regressions can be checked with --benchmark-compare
+"""
+
+import glob
+import os
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from src.update import map_plots, ts_plots, update  # noqa: E402
+from src.utils import Data, get_data  # noqa: E402
+
+
+class run_args:
+    def __init__(self, datadir):
+        self.datadir = datadir
+        self.refresh = False
+        self.out_html = os.path.join(datadir, "dashboard.html")
+
+
+def remove(pattern):
+    for filename in glob.glob(pattern):
+        os.remove(filename)
+
+
+@pytest.mark.parametrize("cached", [False, True], ids=["tsv", "npz"])
+def test_read_zip_COVID(benchmark, track_memory, datadir, cached):
+    def setup():
+        if not cached:
+            remove(os.path.join(datadir, "cases.npz"))
+        return (Data(datadir=datadir),), {}
+
+    Data(datadir=datadir).read_zip_COVID()
+    track_memory(lambda: Data.read_zip_COVID(*setup()[0]))
+    benchmark.pedantic(Data.read_zip_COVID, setup=setup, rounds=5)
+
+
+@pytest.mark.parametrize("cached", [False, True], ids=["shapefile", "gpkg"])
+def test_read_map(benchmark, track_memory, datadir, cached):
+    def setup():
+        if not cached:
+            remove(os.path.join(datadir, "tl_2019_us_zcta510.*.gpkg"))
+        data = Data(datadir=datadir)
+        data.read_zip_map()
+        return (data,), {}
+
+    Data.read_map(*setup()[0])
+    track_memory(lambda: Data.read_map(*setup()[0]))
+    benchmark.pedantic(Data.read_map, setup=setup, rounds=3)
+
+
+def test_get_data(benchmark, track_memory, datadir):
+    kwargs = dict(
+        ts_data_file=os.path.join(datadir, "ts.csv"),
+        map_data_file=os.path.join(datadir, "MD.geojson"),
+        datadir=datadir,
+    )
+    track_memory(get_data, **kwargs)
+    benchmark.pedantic(get_data, kwargs=kwargs, rounds=3)
+
+
+def test_ts_plots(benchmark, track_memory, outputs):
+    track_memory(ts_plots, outputs[0])
+    benchmark.pedantic(ts_plots, args=(outputs[0],), rounds=3)
+
+
+def test_map_plots(benchmark, track_memory, outputs):
+    track_memory(map_plots, outputs[1])
+    benchmark.pedantic(map_plots, args=(outputs[1],), rounds=3)
+
+
+def test_save(benchmark, track_memory, datadir, outputs):
+    from bokeh.io import save
+    from bokeh.resources import CDN
+
+    dashboard = update(run_args(datadir), get_app=True)
+    html_file = os.path.join(datadir, "dashboard.html")
+    kwargs = dict(filename=html_file, resources=CDN, title="COVID19 MD")
+    track_memory(save, dashboard, **kwargs)
+    benchmark.pedantic(save, args=(dashboard,), kwargs=kwargs, rounds=3)
@@ -0,0 +1,129 @@
+import glob
+import os
+import shutil
+import tracemalloc
+
+import pandas as pd
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(REPO_DIR, "data")
+
+
+def data_zips():
+    """
+    all zip codes in data/*.tsv
+    """
+    return sorted(
+        set(
+            pd.concat(
+                pd.read_csv(tsv, sep="\t", names=["Zip", "Cases"], usecols=["Zip"])
+                for tsv in glob.glob(DATA_DIR + "/*.tsv")
+            ).Zip
+        )
+    )
+
+
+def write_zip_map(filename, zips):
+    """
+    zip code to city table in the format of DataUrls.zip_to_city,
+    with a few zip codes of another state
+    """
+    rows = [(zip_code, "City%i" % (zip_code // 20), "MD") for zip_code in zips]
+    rows += [(10001, "New York", "NY"), (10002, "New York", "NY")]
+    pd.DataFrame(
+        rows,
+        columns=["Zip Code", "Official USPS city name", "Official USPS State Code"],
+    ).to_csv(filename, sep=";", index=False)
+
+
+def write_population(filename, zips):
+    """
+    population table in the format of DataUrls.maryland_zip_population,
+    with one row of two zip codes and a footer row
+    """
+    rows = [("%i and %i" % tuple(zips[:2]), 2000)]
+    rows += [(str(zip_code), 1000 + zip_code % 977) for zip_code in zips[2:]]
+    rows += [("Total", 0)]
+    with open(filename, "w") as html:
+        html.write("<html><body><table>")
+        html.write("<tr><th>Rank</th><th>Zip Code</th><th>Population</th></tr>")
+        for rank, (zip_code, population) in enumerate(rows, 1):
+            html.write(
+                "<tr><td>%i</td><td>%s</td><td>%i</td></tr>"
+                % (rank, zip_code, population)
+            )
+        html.write("</table></body></html>")
+
+
+def write_shapefile(filename, zips):
+    """
+    round zip code shapes on a grid inside the MD bounding box
+    """
+    import geopandas as gpd
+    from shapely.geometry import Point
+
+    gpd.GeoDataFrame(
+        {"ZCTA5CE10": [str(zip_code) for zip_code in zips]},
+        geometry=[
+            Point(-79 + (i % 20) * 0.2, 38.05 + (i // 20) * 0.06).buffer(0.03, 16)
+            for i in range(len(zips))
+        ],
+        crs="EPSG:4269",
+    ).to_file(filename)
+
+
+@pytest.fixture(scope="session")
+def datadir(tmp_path_factory):
+    """
+    data directory with the daily tsv files and the zip code shapes,
+    and offline reference data (see src.fetch.FetchCache)
+    """
+    datadir = tmp_path_factory.mktemp("data")
+    fixture_dir = tmp_path_factory.mktemp("fixtures")
+    zips = data_zips()
+    for tsv in glob.glob(DATA_DIR + "/*.tsv"):
+        shutil.copy(tsv, datadir)
+    write_shapefile(str(datadir / "tl_2019_us_zcta510.shp"), zips)
+    write_zip_map(str(fixture_dir / "zip_to_city"), zips)
+    write_population(str(fixture_dir / "maryland_zip_population"), zips)
+
+    # the monkeypatch fixture is function scoped
+    monkeypatch = pytest.MonkeyPatch()
+    monkeypatch.setenv("COVID19_FIXTURES", str(fixture_dir))
+    yield str(datadir)
+    monkeypatch.undo()
+
+
+@pytest.fixture(scope="session")
+def outputs(datadir):
+    """
+    time series and map data from get_data
+    """
+    from src.utils import get_data
+
+    return get_data(
+        ts_data_file=os.path.join(datadir, "ts.csv"),
+        map_data_file=os.path.join(datadir, "MD.geojson"),
+        datadir=datadir,
+    )
+
+
+@pytest.fixture
+def track_memory(benchmark):
+    """
+    run the function once more under tracemalloc,
+    and record the peak memory in the benchmark's extra info
+    """
+
+    def track(func, *args, **kwargs):
+        tracemalloc.start()
+        try:
+            func(*args, **kwargs)
+            benchmark.extra_info["peak_memory_mib"] = round(
+                tracemalloc.get_traced_memory()[1] / (1 << 20), 2
+            )
+        finally:
+            tracemalloc.stop()
+
+    return track
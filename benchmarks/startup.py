@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+time the startup of the dashboard.py subcommands and the imports of the src modules,
+each in a fresh interpreter
+
+    python benchmarks/startup.py -n 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMANDS = {
+    "dashboard.py check --help": ["dashboard.py", "check", "--help"],
+    "dashboard.py check": ["dashboard.py", "check"],
+    "dashboard.py get --help": ["dashboard.py", "get", "--help"],
+    "dashboard.py update --help": ["dashboard.py", "update", "--help"],
+    "import src.utils": ["-c", "import src.utils"],
+    "import src.check": ["-c", "import src.check"],
+    "import src.download": ["-c", "import src.download"],
+    "import src.update": ["-c", "import src.update"],
+}
+
+
+def run_time(args, repeat):
+    """
+    :param args (list): arguments to the python interpreter
+    :param repeat (int): number of runs
+    :return: list of wall times (seconds)
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable] + args,
+            cwd=REPO_DIR,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time of the CLI")
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="runs per command")
+    args = parser.parse_args()
+
+    print("%-30s %8s %8s" % ("command", "min(s)", "median(s)"))
+    for name, command in COMMANDS.items():
+        try:
+            times = run_time(command, args.repeat)
+        except subprocess.CalledProcessError:
+            print("%-30s %8s %8s" % (name, "-", "-"))
+            continue
+        print("%-30s %8.3f %8.3f" % (name, min(times), statistics.median(times)))
+
+
+if __name__ == "__main__":
+    main()
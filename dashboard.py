@@ -1,9 +1,8 @@
 #!/usr/bin/env python
 
 import argparse
-
-from src.download import get
-from src.update import check_update, update
+import sys
+from datetime import date
 
 
 def get_opt():
@@ -15,11 +14,43 @@ def get_opt():
     check = subparsers.add_parser(
         name="check", description="check if MD gov database is updated?"
     )
+    check.add_argument(
+        "--upstream",
+        action="store_true",
+        help="Print the days in MD gov database after the latest tsv file in --datadir,"
+        " from the database's metadata only (exit status 1 if there is no new day)",
+    )
+    check.add_argument(
+        "--datadir",
+        default="./data",
+        help="Directory of tsv files for --upstream (default: ./data)",
+    )
 
     # get data fomr date
-    check = subparsers.add_parser(name="get", description="get data from a given date")
+    check = subparsers.add_parser(
+        name="get",
+        description="get data from a given date, "
+        "or write the data of many dates to the data directory with one download",
+    )
+    dates = check.add_mutually_exclusive_group(required=True)
+    dates.add_argument("--date", help="Getting data for this date (e.g. 2020-09-10)")
+    dates.add_argument(
+        "--start", help="Getting data from this date to --end (e.g. 2020-09-10)"
+    )
+    dates.add_argument(
+        "--missing",
+        action="store_true",
+        help="Getting data for all dates without a (non-empty) tsv file in --datadir",
+    )
     check.add_argument(
-        "--date", help="Getting data for this date (e.g. 2020-09-10)", required=True
+        "--end",
+        default=str(date.today()),
+        help="Last date for --start/--missing (default: today)",
+    )
+    check.add_argument(
+        "--datadir",
+        default="./data",
+        help="Output directory of tsv files for --start/--missing (default: ./data)",
     )
     # update dashboard
     update = subparsers.add_parser(
@@ -36,12 +67,31 @@ def get_opt():
     update.add_argument(
         "--refresh",
         action="store_true",
-        help="Fetch data and create data table?\n"
-        "(default: False; only create if the data table is not created today)",
+        help="Create the data tables even if they are up to date\n"
+        "(default: False; with --datadir, only create if a tsv file or a data table "
+        "changed since the last run, otherwise if the data table is not created today)",
     )
     update.add_argument(
         "-o", "--out_html", default="./dashboard.html", help="Output html file path"
     )
+    update.add_argument(
+        "--data-assets",
+        dest="data_assets",
+        help="Write the time series and map data to this directory,\n"
+        "and let the html page fetch them, instead of inlining them into the html\n"
+        "(for a standalone page served with this directory)",
+    )
+    update.add_argument(
+        "--data-url",
+        dest="data_url",
+        help="URL of --data-assets as seen from the html page\n"
+        "(default: path of --data-assets relative to the html file)",
+    )
+    update.add_argument(
+        "--report",
+        help="Write the wall time, CPU time, peak memory and rows of each stage\n"
+        "to this json file",
+    )
 
     args = parser.parse_args()
     return args
@@ -49,9 +99,28 @@ def get_opt():
 
 if __name__ == "__main__":
     args = get_opt()
+    # each subcommand imports only what it needs (see benchmarks/startup.py)
     if args.subcommand == "update":
+        from src.instrument import report
+        from src.update import update
+
         update(args)
+        if args.report:
+            report.save(args.report)
     elif args.subcommand == "check":
+        from src.check import check_update, upstream_new_dates
+
+        if args.upstream:
+            new_dates = upstream_new_dates(args.datadir)
+            print("\n".join(new_dates))
+            sys.exit(0 if new_dates else 1)
         check_update()
     elif args.subcommand == "get":
-        get(args.date)
+        from src.download import date_range, get, get_dates, missing_dates
+
+        if args.date:
+            get(args.date)
+        elif args.start:
+            get_dates(date_range(args.start, args.end), args.datadir)
+        else:
+            get_dates(missing_dates(args.datadir, end=args.end), args.datadir)
@@ -0,0 +1,130 @@
+import datetime
+import re
+
+import pandas as pd
+
+from .utils import COVIDerror, logger
+
+CASE_FIELD = re.compile(r"^total[0-9]{2}_[0-9]{2}_[0-9]{4}$")  # totalMM_DD_YYYY
+
+
+def case_dates(fields):
+    """
+    dates of the daily case fields (totalMM_DD_YYYY), parsed once per field
+
+    :param fields (list): case field names
+    :return: numpy.ndarray of datetime64
+    """
+    return pd.to_datetime(
+        [field[-len("MM_DD_YYYY") :] for field in fields], format="%m_%d_%Y"
+    ).to_numpy()
+
+
+class FeatureServer:
+    """
+    Client for querying the attributes of an ArcGIS FeatureServer layer
+    (e.g. DataUrls.zip_covid_layer), without the geometries
+
+    Only the requested fields are downloaded, page by page (resultOffset), and the
+    records of each page are added to columns of a data frame. Queries are sent as
+    POST forms, since the list of all the daily case fields is longer than the query
+    string limit of the servers.
+    """
+
+    def __init__(self, url, page_size=None, timeout=60):
+        """
+        :param url (str): layer url (.../FeatureServer/<layer id>)
+        :param page_size (int): records per request (default: the layer's maximum)
+        :param timeout (int): seconds to wait for each request
+        """
+        self.url = url.rstrip("/")
+        self.page_size = page_size
+        self.timeout = timeout
+        self._metadata = None
+
+    def _request(self, url, params, post=False):
+        import requests
+
+        params = dict(params, f="json")
+        try:
+            if post:  # the field list of all the days is too long for a url
+                response = requests.post(url, data=params, timeout=self.timeout)
+            else:
+                response = requests.get(url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            content = response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise COVIDerror("Failed querying %s: %s" % (url, e))
+        if "error" in content:
+            raise COVIDerror("Failed querying %s: %s" % (url, content["error"]))
+        return content
+
+    @property
+    def metadata(self):
+        """
+        layer description: fields, maxRecordCount, objectIdField ...
+        """
+        if self._metadata is None:
+            self._metadata = self._request(self.url, {})
+        return self._metadata
+
+    def fields(self):
+        """
+        :return: list of field names of the layer
+        """
+        return [field["name"] for field in self.metadata["fields"]]
+
+    def case_fields(self):
+        """
+        :return: list of the daily case fields (totalMM_DD_YYYY) of the layer
+        """
+        return [field for field in self.fields() if CASE_FIELD.match(field)]
+
+    def last_edit(self):
+        """
+        :return: time of the last edit of the layer (UTC datetime), None if unknown
+        """
+        last_edit = self.metadata.get("editingInfo", {}).get("lastEditDate")
+        if last_edit is None:
+            return None
+        return datetime.datetime.fromtimestamp(
+            last_edit / 1000, tz=datetime.timezone.utc
+        )
+
+    def query(self, fields, where="1=1"):
+        """
+        :param fields (list): field names to download
+        :param where (str): SQL filter of the records
+        :return: pandas.DataFrame with one column per field
+        """
+        missing = set(fields) - set(self.fields())
+        if missing:
+            raise IndexError("Fields %s not in %s" % (sorted(missing), self.url))
+        page_size = self.metadata.get("maxRecordCount", 1000)
+        if self.page_size:
+            page_size = min(self.page_size, page_size)
+        params = {
+            "where": where,
+            "outFields": ",".join(fields),
+            "returnGeometry": "false",
+            "resultRecordCount": page_size,
+            "orderByFields": self.metadata.get("objectIdField", "OBJECTID"),
+        }
+
+        columns = {field: [] for field in fields}
+        offset = 0
+        while True:
+            page = self._request(
+                self.url + "/query", dict(params, resultOffset=offset), post=True
+            )
+            features = page.get("features", [])
+            for field, values in columns.items():
+                values.extend(feature["attributes"][field] for feature in features)
+            offset += len(features)
+            if not features or not page.get("exceededTransferLimit", False):
+                break
+        logger.info(
+            "Downloaded %i records of %i fields from %s"
+            % (offset, len(fields), self.url)
+        )
+        return pd.DataFrame(columns, columns=fields)
@@ -0,0 +1,134 @@
+import json
+import os
+
+import numpy as np
+from bokeh.models import ColumnDataSource, GeoJSONDataSource
+
+from .utils import logger
+
+MS_PER_DAY = 86400000
+EMPTY_GEOJSON = '{"type": "FeatureCollection", "features": []}'
+
+# fetch the data files after the Bokeh document is rendered and fill in the sources
+LOADER_TEMPLATE = """
+{% block postamble %}
+<script type="text/javascript">
+(function() {
+  var assets = {{ assets }};
+
+  function loadLines(source, buffer) {
+    // int32 [n lines][n + 1 offsets][days since epoch], float32 [values]
+    var n = new Int32Array(buffer, 0, 1)[0];
+    var offsets = new Int32Array(buffer, 4, n + 1);
+    var days = new Int32Array(buffer, 4 * (n + 2), offsets[n]);
+    var values = new Float32Array(buffer, 4 * (n + 2 + offsets[n]), offsets[n]);
+    var xs = [];
+    var ys = [];
+    for (var i = 0; i < n; i++) {
+      xs.push(Float64Array.from(days.subarray(offsets[i], offsets[i + 1]),
+                                function(day) { return day * 86400000; }));
+      ys.push(values.subarray(offsets[i], offsets[i + 1]));
+    }
+    source.data = Object.assign({}, source.data, {xs: xs, ys: ys});
+  }
+
+  function reportError(url, error) {
+    // e.g. a missing data file, or the page opened from file:// without a server
+    console.error('Failed loading ' + url + ': ' + error);
+    var message = document.createElement('p');
+    message.style.color = 'red';
+    message.textContent = 'Failed loading the data of the plots (' + url + ')';
+    document.body.insertBefore(message, document.body.firstChild);
+  }
+
+  function load(doc) {
+    Object.keys(assets).forEach(function(name) {
+      var source = doc.get_model_by_name(name);
+      var asset = assets[name];
+      fetch(asset.url)
+        .then(function(response) {
+          if (!response.ok) {
+            throw new Error('HTTP ' + response.status + ' ' + response.statusText);
+          }
+          return asset.kind == 'geojson' ? response.text() : response.arrayBuffer();
+        })
+        .then(function(body) {
+          if (asset.kind == 'geojson') {
+            source.geojson = body;
+          } else {
+            loadLines(source, body);
+          }
+          console.log('Loaded: ' + asset.url);
+        })
+        .catch(function(error) {
+          reportError(asset.url, error);
+        });
+    });
+  }
+
+  var timer = setInterval(function() {
+    if (window.Bokeh && Bokeh.documents.length > 0) {
+      clearInterval(timer);
+      load(Bokeh.documents[0]);
+    }
+  }, 50);
+})();
+</script>
+{% endblock %}
+"""
+
+
+def write_lines(source, filename):
+    """
+    write the xs (datetime in ms) and ys of a multi_line source as typed arrays
+
+    :param source (bokeh.models.ColumnDataSource): source with xs and ys columns
+    :param filename (str): output binary file
+    """
+    xs, ys = source.data["xs"], source.data["ys"]
+    lengths = np.array([len(x) for x in xs], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype("<i4")
+    days = np.round(np.concatenate([[]] + list(xs)) / MS_PER_DAY).astype("<i4")
+    values = np.concatenate([[]] + list(ys)).astype("<f4")
+    with open(filename, "wb") as out:
+        np.array([len(xs)], dtype="<i4").tofile(out)
+        offsets.tofile(out)
+        days.tofile(out)
+        values.tofile(out)
+
+
+def externalize(dashboard, asset_dir, url=None):
+    """
+    move the time series and map data of the dashboard into data files,
+    and leave the sources in the dashboard empty
+
+    :param dashboard: Bokeh layout with named time series and map sources
+    :param asset_dir (str): output directory for the data files
+    :param url (str): URL of asset_dir as seen from the html page (default: asset_dir)
+    :return: template for bokeh.io.save, that loads the data files into the page
+    """
+    os.makedirs(asset_dir, exist_ok=True)
+    url = (url or asset_dir).rstrip("/")
+    assets = {}
+    for model in dashboard.references():
+        if not model.name:
+            continue
+        if isinstance(model, GeoJSONDataSource):
+            filename = model.name + ".geojson"
+            with open(os.path.join(asset_dir, filename), "w") as out:
+                out.write(model.geojson)
+            model.geojson = EMPTY_GEOJSON
+            assets[model.name] = {"url": url + "/" + filename, "kind": "geojson"}
+        elif isinstance(model, ColumnDataSource) and "xs" in model.data:
+            filename = model.name + ".bin"
+            write_lines(model, os.path.join(asset_dir, filename))
+            model.data.update(
+                xs=[[] for _ in model.data["xs"]], ys=[[] for _ in model.data["ys"]]
+            )
+            assets[model.name] = {"url": url + "/" + filename, "kind": "lines"}
+        else:
+            continue
+        logger.info("Written %s/%s" % (asset_dir, filename))
+    return LOADER_TEMPLATE.replace(
+        "{{ assets }}", "{% raw %}" + json.dumps(assets) + "{% endraw %}"
+    )
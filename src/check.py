@@ -0,0 +1,56 @@
+import glob
+import os
+import re
+import sys
+
+from .utils import Data, DataUrls, logger
+
+TSV_DATE = re.compile(r"^([0-9]{4}-[0-9]{2}-[0-9]{2})\.tsv$")
+
+
+def check_update():
+    """
+    print the latest day of the local data, in the data format
+
+    only needs pandas, so that the check does not pay for the plotting imports
+    """
+    logger.info("Checking database")
+    dat = Data()
+    dat.read_zip_COVID()
+    dat.zip_covid.pipe(lambda d: d[d.Date == d.Date.max()]).query("Cases > 0").assign(
+        Cases=lambda d: d.Cases.astype(int).astype(str) + " Cases"
+    ).to_csv(sys.stdout, index=False, sep="\t", header=False)
+
+
+def latest_local_date(datadir):
+    """
+    :param datadir (str): directory of the daily tsv files
+    :return: the latest date (YYYY-MM-DD) with a non-empty tsv file, None if no file
+    """
+    dates = []
+    for tsv in glob.glob(os.path.join(datadir, "*.tsv")):
+        match = TSV_DATE.match(os.path.basename(tsv))
+        if match and os.path.getsize(tsv) > 0:
+            dates.append(match.group(1))
+    return max(dates, default=None)
+
+
+def upstream_new_dates(datadir, layer_url=DataUrls.zip_covid_layer.value):
+    """
+    days in MD opendata after the latest local tsv file, from the field names of the
+    layer (one small request for its metadata, no download of the data)
+
+    :param datadir (str): directory of the daily tsv files
+    :param layer_url (str): url of the FeatureServer layer
+    :return: sorted list of new dates (YYYY-MM-DD)
+    """
+    from .arcgis import FeatureServer, case_dates
+
+    layer = FeatureServer(layer_url)
+    upstream = sorted(str(date)[:10] for date in case_dates(layer.case_fields()))
+    local = latest_local_date(datadir)
+    logger.info(
+        "Latest day upstream: %s (last edit: %s), local: %s"
+        % (upstream[-1] if upstream else None, layer.last_edit(), local)
+    )
+    return [date for date in upstream if local is None or date > local]
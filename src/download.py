@@ -1,9 +1,9 @@
+import datetime
+import os
 import re
 import sys
 
-import geopandas as gpd
-
-from .utils import Data, logger
+from .utils import FIRST_DAY, Data, logger
 
 
 def parse_date(date):
@@ -16,16 +16,97 @@ def parse_date(date):
     return "total{M}_{D}_{Y}".format(M=month, D=day, Y=year)
 
 
+def date_range(start, end):
+    """
+    all dates from start to end (inclusive) in the format of YYYY-MM-DD
+
+    :param start (str): first date (e.g. 2020-04-12)
+    :param end (str): last date (e.g. 2020-09-10)
+    """
+    start = datetime.datetime.strptime(start, "%Y-%m-%d").date()
+    end = datetime.datetime.strptime(end, "%Y-%m-%d").date()
+    return [str(start + datetime.timedelta(n)) for n in range((end - start).days + 1)]
+
+
+def missing_dates(datadir, end=None):
+    """
+    dates since the first day of the data without a tsv file in datadir, or with an
+    empty one (the day was not in the database yet when it was fetched)
+
+    :param datadir (str): data directory with the daily tsv files
+    :param end (str): last date to check (default: today)
+    """
+    end = end or str(datetime.date.today())
+    return [
+        date
+        for date in date_range(str(FIRST_DAY), end)
+        if not os.path.isfile(os.path.join(datadir, date + ".tsv"))
+        or os.path.getsize(os.path.join(datadir, date + ".tsv")) == 0
+    ]
+
+
+def read_database(dates=None):
+    """
+    download the wide table from MD gov, with ZIP_CODE and one column of cases per
+    day (totalMM_DD_YYYY), only for the dates that are in the table
+
+    :param dates (list): dates in the format of YYYY-MM-DD (default: all dates)
+    """
+    from .arcgis import FeatureServer
+
+    layer = FeatureServer(Data().MD_zip_layer_url)
+    case_fields = layer.case_fields()
+    if dates is not None:
+        columns = [parse_date(date) for date in dates]
+        case_fields = [column for column in columns if column in case_fields]
+    logger.info("Downloading %i days from %s" % (len(case_fields), layer.url))
+    return layer.query(["ZIP_CODE"] + case_fields)
+
+
+def write_day(db, date, out):
+    """
+    Select data from one day of the wide table and output in the data format
+    """
+    column = parse_date(date)
+    logger.info("Using column %s" % column)
+    if column not in db.columns:
+        raise IndexError("Column %s not in database" % column)
+    db.filter(["ZIP_CODE", column]).fillna(0).query("%s>0" % column).assign(
+        **{column: lambda d: d[column].astype(int).astype(str) + " Cases"}
+    ).to_csv(out, sep="\t", index=False, header=False)
+
+
 def get(date):
     """
     Select data from one day and output in the data format
     """
     logger.info("Downloading %s" % date)
-    date = parse_date(date)
-    logger.info("Using column %s" % date)
-    db = gpd.read_file(Data().MD_zip_data_url)
-    if date not in db.columns:
-        raise IndexError("Column %s not in database" % date)
-    db.filter(["ZIP_CODE", date]).fillna(0).query("%s>0" % date).assign(
-        **{date: lambda d: d[date].astype(int).astype(str) + " Cases"}
-    ).to_csv(sys.stdout, sep="\t", index=False, header=False)
+    write_day(read_database([date]), date, sys.stdout)
+
+
+def get_dates(dates, datadir):
+    """
+    Write the data of many days to datadir/YYYY-MM-DD.tsv, with only one download
+
+    :param dates (list): dates in the format of YYYY-MM-DD
+    :param datadir (str): output directory
+    :return: list of written tsv files
+    """
+    if not dates:
+        logger.info("No dates to download")
+        return []
+    db = read_database(dates)
+    written = []
+    for date in dates:
+        tsv_file = os.path.join(datadir, date + ".tsv")
+        try:
+            with open(tsv_file + ".tmp", "w") as out:
+                write_day(db, date, out)
+        except IndexError as e:
+            os.remove(tsv_file + ".tmp")
+            logger.warning("Skipping %s: %s" % (date, e))
+            continue
+        os.replace(tsv_file + ".tmp", tsv_file)
+        written.append(tsv_file)
+    logger.info("Written %i of %i days to %s" % (len(written), len(dates), datadir))
+    return written
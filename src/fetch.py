@@ -0,0 +1,316 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zipfile
+
+from .utils import COVIDerror, logger
+
+CACHE_TTL = 7 * 24 * 3600  # seconds, reference data rarely changes
+CACHE_MAX_BYTES = 200 * 1024 * 1024
+FIXTURE_ENV = "COVID19_FIXTURES"
+CHUNK_SIZE = 8 * 1024 * 1024
+SHAPEFILE_MEMBERS = (".shp", ".shx", ".dbf", ".prj")
+
+
+def _read_meta(meta_file):
+    if not os.path.isfile(meta_file):
+        return {}
+    with open(meta_file) as meta:
+        return json.load(meta)
+
+
+def _write_meta(meta_file, meta):
+    with open(meta_file + ".tmp", "w") as out:
+        json.dump(meta, out)
+    os.replace(meta_file + ".tmp", meta_file)
+
+
+class FetchCache:
+    """
+    On-disk cache for downloading the DataUrls entries
+
+    Each entry is saved as cache_dir/<DataUrls name>, with its ETag/Last-Modified
+    headers in cache_dir/<DataUrls name>.json. Entries younger than the TTL are used
+    without any request, older ones are revalidated with a conditional request.
+    The least recently used entries are removed when the cache is larger than
+    max_bytes. The cache can be shared by threads (see Data.get).
+
+    With a fixture directory (default: $COVID19_FIXTURES), files named after
+    the DataUrls entries are used instead, and nothing is downloaded.
+    """
+
+    def __init__(
+        self,
+        cache_dir,
+        ttl=CACHE_TTL,
+        max_bytes=CACHE_MAX_BYTES,
+        fixture_dir=None,
+        timeout=60,
+    ):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.fixture_dir = fixture_dir or os.environ.get(FIXTURE_ENV)
+        self.timeout = timeout
+        # saving an entry and evicting others (reentrant for the download again)
+        self._lock = threading.RLock()
+
+    def fetch(self, source, ttl=None):
+        """
+        get the file path of the content of a DataUrls entry
+
+        :param source (DataUrls): the entry to download
+        :param ttl (int): seconds before revalidating (default: the cache TTL)
+        :return: path of the downloaded (or fixture) file
+        """
+        if self.fixture_dir:
+            fixture = os.path.join(self.fixture_dir, source.name)
+            if not os.path.isfile(fixture):
+                raise COVIDerror(
+                    "No fixture for %s in %s" % (source.name, self.fixture_dir)
+                )
+            logger.info("Using fixture %s" % fixture)
+            return fixture
+
+        ttl = self.ttl if ttl is None else ttl
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_file = os.path.join(self.cache_dir, source.name)
+        meta_file = cache_file + ".json"
+        meta = _read_meta(meta_file)
+        cached = os.path.isfile(cache_file) and meta.get("url") == source.value
+
+        if cached and time.time() - meta["fetched"] < ttl:
+            logger.info("Using cached %s" % cache_file)
+            os.utime(cache_file)
+            return cache_file
+
+        import requests
+
+        headers = {}
+        if cached and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if cached and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        try:
+            response = requests.get(source.value, headers=headers, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            if cached:
+                logger.warning(
+                    "Failed fetching %s (%s), using cached copy" % (source.value, e)
+                )
+                return cache_file
+            raise
+
+        meta["fetched"] = time.time()
+        with self._lock:
+            if cached and response.status_code == 304:
+                if not os.path.isfile(cache_file):
+                    # evicted by another thread while revalidating: download again
+                    return self.fetch(source, ttl)
+                logger.info("Not modified: %s" % source.value)
+            else:
+                with open(cache_file + ".tmp", "wb") as out:
+                    out.write(response.content)
+                os.replace(cache_file + ".tmp", cache_file)
+                meta.update(
+                    url=source.value,
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified"),
+                )
+                logger.info("Downloaded %s to %s" % (source.value, cache_file))
+            _write_meta(meta_file, meta)
+            os.utime(cache_file)
+            self._evict(keep=cache_file)
+        return cache_file
+
+    def evict(self, keep=None):
+        """
+        remove the least recently used entries until the cache fits in max_bytes
+
+        :param keep (str): cache file that should not be removed
+        """
+        with self._lock:
+            self._evict(keep)
+
+    def _evict(self, keep=None):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith((".json", ".tmp")):
+                continue
+            entry = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(entry)
+            except FileNotFoundError:  # removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry == keep:
+                continue
+            total -= size
+            _remove(entry, entry + ".json")
+            logger.info("Removed %s from cache" % entry)
+
+
+def _remove(*filenames):
+    for filename in filenames:
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
+
+
+def _validator(response):
+    """
+    ETag or Last-Modified of a response, to check with If-Range that a resumed
+    download is of the same file (weak ETags can't be used for ranges)
+    """
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
+
+
+def download_file(
+    url, filename, sha1=None, verify=None, chunk_size=CHUNK_SIZE, timeout=60
+):
+    """
+    download a large file to filename.part, and rename it to filename once its size
+    (and sha1, or content) is verified
+
+    The ETag (or Last-Modified) and the size of the file are kept in
+    filename.part.json, so that an interrupted download is resumed with a Range
+    request only if the file did not change (If-Range); otherwise, or without them,
+    the download starts again.
+
+    :param url (str): url of the file
+    :param filename (str): output file
+    :param sha1 (str): expected sha1 hex digest (not checked if None)
+    :param verify (function): raises COVIDerror if the downloaded file is corrupted
+        (e.g. verify_zip)
+    :param chunk_size (int): bytes to write at a time
+    :param timeout (int): seconds to wait for the server
+    """
+    import requests
+    from tqdm import tqdm
+
+    part_file = filename + ".part"
+    meta_file = part_file + ".json"
+    meta = _read_meta(meta_file)
+    offset = os.path.getsize(part_file) if os.path.isfile(part_file) else 0
+    if offset and not (meta.get("url") == url and meta.get("validator")):
+        offset = 0  # can't tell if the partial file is of the same file
+    total_size = meta.get("size", 0) if offset else 0
+    logger.info("Downloading: %s to %s" % (url, filename))
+    try:
+        if not offset or offset != total_size:
+            headers = {}
+            if offset:
+                headers = {"Range": "bytes=%i-" % offset, "If-Range": meta["validator"]}
+            with requests.get(url, headers=headers, stream=True, timeout=timeout) as r:
+                if r.status_code == 416:  # not a range of the recorded file
+                    _remove(part_file, meta_file)
+                    return download_file(
+                        url, filename, sha1, verify, chunk_size, timeout
+                    )
+                r.raise_for_status()
+                if r.status_code == 206:
+                    logger.info("Resuming from %i bytes" % offset)
+                else:  # changed, or no range support: start again
+                    offset = 0
+                    total_size = int(r.headers.get("content-length", 0))
+                    _write_meta(
+                        meta_file,
+                        {"url": url, "validator": _validator(r), "size": total_size},
+                    )
+                with open(part_file, "ab" if offset else "wb") as out, tqdm(
+                    total=total_size, initial=offset, unit="iB", unit_scale=True
+                ) as progress:
+                    for data in r.iter_content(chunk_size):
+                        out.write(data)
+                        progress.update(len(data))
+    except requests.RequestException as e:
+        raise COVIDerror(
+            "Failed downloading %s (%s), run again to resume from %s"
+            % (url, e, part_file)
+        )
+
+    size = os.path.getsize(part_file)
+    if size == 0 or (total_size and size != total_size):
+        raise COVIDerror(
+            "Incomplete download of %s: %i of %i bytes" % (url, size, total_size)
+        )
+    if sha1:
+        digest = hashlib.sha1()
+        with open(part_file, "rb") as f:
+            for block in iter(lambda: f.read(chunk_size), b""):
+                digest.update(block)
+        if digest.hexdigest() != sha1:
+            _remove(part_file, meta_file)
+            raise COVIDerror("Checksum mismatch for %s" % url)
+    if verify:
+        try:
+            verify(part_file)
+        except COVIDerror:
+            _remove(part_file, meta_file)
+            raise
+    os.replace(part_file, filename)
+    _remove(meta_file)
+    logger.info("Downloaded %s" % filename)
+    return filename
+
+
+def verify_zip(zip_file):
+    """
+    check the CRC of every member of a zip file
+
+    :param zip_file (str): zip file
+    """
+    try:
+        with zipfile.ZipFile(zip_file) as archive:
+            bad_member = archive.testzip()
+    except zipfile.BadZipFile as e:
+        raise COVIDerror("Corrupted zip file %s: %s" % (zip_file, e))
+    if bad_member:
+        raise COVIDerror(
+            "Corrupted zip file %s: bad CRC of %s" % (zip_file, bad_member)
+        )
+
+
+def extract_members(zip_file, outdir, suffixes=SHAPEFILE_MEMBERS):
+    """
+    extract the members with the given suffixes from a zip file, each checked against
+    its CRC and written atomically
+
+    :param zip_file (str): zip file
+    :param outdir (str): output directory
+    :param suffixes (tuple): suffixes of the members to extract
+    :return: list of extracted files
+    """
+    extracted = []
+    try:
+        with zipfile.ZipFile(zip_file) as archive:
+            for member in archive.infolist():
+                if member.is_dir() or not member.filename.lower().endswith(suffixes):
+                    continue
+                out_file = os.path.join(outdir, os.path.basename(member.filename))
+                with archive.open(member) as data, open(out_file + ".tmp", "wb") as out:
+                    while True:
+                        block = data.read(CHUNK_SIZE)
+                        if not block:
+                            break
+                        out.write(block)
+                os.replace(out_file + ".tmp", out_file)
+                extracted.append(out_file)
+    except zipfile.BadZipFile as e:
+        # removed, so that the next run downloads it again
+        _remove(zip_file)
+        raise COVIDerror("Corrupted zip file %s: %s" % (zip_file, e))
+    logger.info("Extracted %s from %s" % (", ".join(extracted), zip_file))
+    return extracted
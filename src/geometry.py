@@ -0,0 +1,88 @@
+import hashlib
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.ops import transform
+
+from .utils import COORDINATE_PRECISION, SIMPLIFY_TOLERANCE, logger, remove_stale
+
+
+def round_coordinates(geometry, precision=COORDINATE_PRECISION):
+    """
+    round the coordinates of a shapely geometry
+
+    :param geometry: shapely geometry
+    :param precision (int): number of decimal places to keep
+    """
+    return transform(
+        lambda x, y, z=None: (np.round(x, precision), np.round(y, precision)),
+        geometry,
+    )
+
+
+def simplify(geo, tolerance=SIMPLIFY_TOLERANCE, precision=COORDINATE_PRECISION):
+    """
+    topology-preserving simplification and coordinate rounding of the shapes,
+    to keep the geojson embedded in the dashboard small
+
+    :param geo (geopandas.GeoDataFrame): shapes
+    :param tolerance (float): simplification tolerance in the unit of the CRS (0 to skip)
+    :param precision (int): number of decimal places to keep (None to skip)
+    :return: geopandas.GeoDataFrame with the simplified geometry
+    """
+    geometry = geo.geometry
+    if tolerance:
+        geometry = geometry.simplify(tolerance, preserve_topology=True)
+    if precision is not None:
+        geometry = geometry.apply(round_coordinates, precision=precision)
+    return geo.set_geometry(geometry)
+
+
+def shape_checksum(zip_geo):
+    """
+    sha1 hex digest of the zip code to city mapping and the zip code shapes
+
+    :param zip_geo (geopandas.GeoDataFrame): with columns Zip, City, State and geometry
+    """
+    sha1 = hashlib.sha1()
+    sha1.update(
+        pd.util.hash_pandas_object(
+            zip_geo.filter(["Zip", "City", "State"]), index=False
+        ).to_numpy()
+    )
+    for shape in zip_geo.geometry:
+        sha1.update(shape.wkb)
+    return sha1.hexdigest()
+
+
+def city_shapes(zip_geo, cache_dir=None):
+    """
+    dissolve the zip code shapes into city shapes
+
+    The city shapes are cached in cache_dir (cities.<checksum>.gpkg), and only rebuilt
+    when the zip code to city mapping or the zip code shapes change (the cache of the
+    previous ones is then removed).
+
+    :param zip_geo (geopandas.GeoDataFrame): with columns Zip, City, State and geometry
+    :param cache_dir (str): directory for the cached city shapes (None for no caching)
+    :return: geopandas.GeoDataFrame with columns City, State and geometry
+    """
+    zip_geo = zip_geo.filter(["Zip", "City", "State", "geometry"]).sort_values("Zip")
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = os.path.join(
+            cache_dir, "cities.%s.gpkg" % shape_checksum(zip_geo)[:12]
+        )
+        if os.path.isfile(cache_file):
+            logger.info("Loaded city shapes from %s" % cache_file)
+            return gpd.read_file(cache_file)
+
+    cities = zip_geo.drop("Zip", axis=1).dissolve(by=["City", "State"]).reset_index()
+    logger.info("Dissolved %i zip codes into %i cities" % (len(zip_geo), len(cities)))
+    if cache_file is not None:
+        cities.to_file(cache_file, driver="GPKG")
+        logger.info("Written %s" % cache_file)
+        remove_stale(cache_file, os.path.join(cache_dir, "cities.*.gpkg"))
+    return cities
@@ -0,0 +1,143 @@
+import contextlib
+import datetime
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+# same logger as src.utils, which imports this module
+logger = logging.getLogger("COVID19")
+
+
+def peak_rss_mib():
+    """
+    peak resident memory of the process so far (None if not available)
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20 if sys.platform == "darwin" else 1 << 10)
+
+
+class RunReport:
+    """
+    wall time, CPU time, peak RSS and row counts of the stages of a run,
+    stages started inside another stage are named <outer stage>/<stage>,
+    also in threads started with RunReport.within(report.current(), ...)
+    """
+
+    def __init__(self):
+        self._local = threading.local()  # open stages of each thread
+        self.reset()
+
+    def _open_stages(self):
+        return getattr(self._local, "stages", ())
+
+    def current(self):
+        """
+        the innermost open stage of this thread (None if none), to pass to within
+        """
+        open_stages = self._open_stages()
+        return open_stages[-1] if open_stages else None
+
+    def within(self, parent, func, *args, **kwargs):
+        """
+        call func (e.g. in a worker thread) with parent as its outer stage
+
+        :param parent (dict): stage from current() in the thread starting the work
+        """
+        open_stages = self._open_stages()
+        self._local.stages = (parent,) if parent is not None else ()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._local.stages = open_stages
+
+    def reset(self):
+        self.started = datetime.datetime.now()
+        self.stages = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        record the code in the with block as a stage
+        """
+        open_stages = self._open_stages()
+        record = {"stage": "/".join([r["stage"] for r in open_stages[-1:]] + [name])}
+        self.stages.append(record)
+        self._local.stages = open_stages + (record,)
+        wall, cpu, rss = time.perf_counter(), time.process_time(), peak_rss_mib()
+        try:
+            yield record
+        finally:
+            self._local.stages = open_stages
+            record["wall_s"] = round(time.perf_counter() - wall, 4)
+            record["cpu_s"] = round(time.process_time() - cpu, 4)
+            if rss is not None:
+                record["peak_rss_mib"] = round(peak_rss_mib(), 1)
+                record["peak_rss_increase_mib"] = round(peak_rss_mib() - rss, 1)
+            logger.info(
+                "Stage %s: %.2f s (CPU %.2f s), %s rows, peak RSS %s MiB"
+                % (
+                    record["stage"],
+                    record["wall_s"],
+                    record["cpu_s"],
+                    record.get("rows", "-"),
+                    record.get("peak_rss_mib", "-"),
+                )
+            )
+
+    def count(self, rows):
+        """
+        set the number of rows of the current stage
+        """
+        record = self.current()
+        if record is not None:
+            record["rows"] = int(rows)
+
+    def to_dict(self):
+        return {
+            "started": self.started.isoformat(timespec="seconds"),
+            "wall_s": round(
+                sum(r.get("wall_s", 0) for r in self.stages if "/" not in r["stage"]),
+                4,
+            ),
+            "peak_rss_mib": round(peak_rss_mib() or 0, 1),
+            "stages": self.stages,
+        }
+
+    def save(self, filename):
+        """
+        write the report as json
+        """
+        dirname = os.path.dirname(filename)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        with open(filename + ".tmp", "w") as out:
+            json.dump(self.to_dict(), out, indent=1)
+        os.replace(filename + ".tmp", filename)
+        logger.info("Written run report %s" % filename)
+
+
+report = RunReport()
+
+
+def timed(func):
+    """
+    decorator recording each call of the function as a stage of the run report
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with report.stage(func.__qualname__):
+            return func(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,85 @@
+import glob
+import json
+import os
+
+from .utils import file_checksum, logger
+
+
+def tsv_checksums(datadir):
+    """
+    :param datadir (str): directory of the daily tsv files
+    :return: dict of date -> sha1 of the tsv file of the date
+    """
+    return {
+        os.path.basename(tsv).replace(".tsv", ""): file_checksum(tsv)
+        for tsv in sorted(glob.glob(os.path.join(datadir, "*.tsv")))
+    }
+
+
+class Manifest:
+    """
+    A json record of the daily tsv files (date -> sha1) that went into some outputs,
+    together with checksums of the other inputs and the outputs
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.dates = {}
+        self.checksums = {}
+        if os.path.isfile(filename):
+            with open(filename) as manifest:
+                content = json.load(manifest)
+            self.dates = content.get("dates", {})
+            self.checksums = content.get("checksums", {})
+
+    def save(self):
+        tmp_file = self.filename + ".tmp"
+        with open(tmp_file, "w") as manifest:
+            json.dump(
+                {
+                    "dates": self.dates,
+                    "checksums": self.checksums,
+                },
+                manifest,
+                indent=1,
+                sort_keys=True,
+            )
+        os.replace(tmp_file, self.filename)
+        logger.info("Written %s (%i days)" % (self.filename, len(self.dates)))
+
+    def new_dates(self, dates):
+        """
+        :param dates (dict): date -> sha1
+        :return: sorted dates that are not in the manifest yet
+        """
+        return sorted(set(dates) - set(self.dates))
+
+    def changed_dates(self, dates):
+        """
+        :param dates (dict): date -> sha1
+        :return: sorted dates in the manifest that are removed or have a different sha1
+        """
+        return sorted(
+            date for date, sha1 in self.dates.items() if dates.get(date) != sha1
+        )
+
+    def matches(self, name, filename):
+        """
+        is the file there, and the same as the one recorded under name?
+        """
+        return os.path.isfile(filename) and self.checksums.get(name) == file_checksum(
+            filename
+        )
+
+    def is_current(self, dates, outputs):
+        """
+        :param dates (dict): date -> sha1 of the current tsv files
+        :param outputs (dict): name -> output file recorded in the manifest
+        :return: True if no tsv file is added, removed or changed,
+            and the output files are as recorded
+        """
+        return (
+            not self.new_dates(dates)
+            and not self.changed_dates(dates)
+            and all(self.matches(name, filename) for name, filename in outputs.items())
+        )
@@ -1,5 +1,6 @@
 import math
 
+import numpy as np
 from bokeh.layouts import column
 from bokeh.models import (
     ColorBar,
@@ -20,6 +21,12 @@ PLOT_HEIGHT = 700
 COLORBAR_WIDTH = 400
 COLORBAR_HEIGHT = 20
 TEXT_SIZE_PTS = "25pt"
+LINE_COLOR = "lightgray"
+LINE_ALPHA = 0.3
+LINE_WIDTH = 2
+HIGHLIGHT_COLOR = "red"
+HIGHLIGHT_ALPHA = 0.7
+HIGHLIGHT_WIDTH = 5
 
 
 def plot_map(map_df, with_zip=True, today=None):
@@ -46,10 +53,12 @@ def plot_map(map_df, with_zip=True, today=None):
     if with_zip:
         logger.info("Plotting %i zip codes" % map_df.shape[0])
         tooltips.append(("Zip code", "@Zip"))
-        geosource = GeoJSONDataSource(geojson=map_df.drop("Date", axis=1).to_json())
+        geosource = GeoJSONDataSource(
+            geojson=map_df.drop("Date", axis=1).to_json(), name="Zip_map"
+        )
     else:
         logger.info("Plotting %i cities" % map_df.shape[0])
-        geosource = GeoJSONDataSource(geojson=map_df.to_json())
+        geosource = GeoJSONDataSource(geojson=map_df.to_json(), name="City_map")
     col = "Daily"
     title = "New COVID19 cases in MD (%s; +%i)" % (today, total_new_case)
     color_mapper = LinearColorMapper(
@@ -161,40 +170,63 @@ class TSplot:
         self.p.xaxis.major_label_orientation = math.pi / 3
         logger.info("Initialized ts plot")
 
-    def plot(self, grouping):
+    def plot(self, grouping, highlight=None):
+        """
+        plot all groups with one multi_line renderer, and the highlighted group on top
+        of them with a second renderer, whose source only holds that group's line, so
+        that highlighting a group only copies one line
+
+        The hover snaps to the nearest point of a line, and shows its data values
+        """
         if grouping == "Zip":
             self.tooltips.append(("Zip code", "@Zip"))
-        self.lines = []
-        for group, group_df in self.ts_data.groupby(grouping):
-            source = ColumnDataSource(group_df)
-
-            if group in ["Rockville", "20850"]:
-                color = "red"
-                alpha = 0.7
-                lw = 5
-                level = "overlay"
-            else:
-                color = "lightgray"
-                alpha = 0.3
-                lw = 2
-                level = "underlay"
-
-            line = self.p.line(
-                x="Date",
-                y=self.y,
-                color=color,
-                line_alpha=alpha,
-                line_width=lw,
-                legend_label=str(group),
-                name=str(group),
-                source=source,
-            )
-            line.level = level
-            # add tool tips
-            self.lines.append(line)
-        hover = HoverTool(tooltips=self.tooltips)
+        ts_data = self.ts_data.assign(
+            **{grouping: lambda d: d[grouping].astype(str)}
+        ).sort_values([grouping, "Date"])
+        groups, starts = np.unique(ts_data[grouping].to_numpy(), return_index=True)
+        names = [str(group) for group in groups]
+        dates = ts_data.Date.to_numpy(dtype="datetime64[ms]").astype(float)
+        self.source = ColumnDataSource(
+            {
+                grouping: names,
+                "City": ts_data.City.to_numpy()[starts],
+                "xs": np.split(dates, starts[1:]),
+                "ys": np.split(ts_data[self.y].to_numpy(dtype=float), starts[1:]),
+            },
+            name="%s_%s" % (grouping, self.y),
+        )
+        self.lines = self.p.multi_line(
+            xs="xs",
+            ys="ys",
+            line_color=LINE_COLOR,
+            line_alpha=LINE_ALPHA,
+            line_width=LINE_WIDTH,
+            source=self.source,
+        )
+        self.index = {name: i for i, name in enumerate(names)}
+        selected = [self.index[str(highlight)]] if str(highlight) in self.index else []
+        self.highlight_source = ColumnDataSource(
+            {
+                column: [self.source.data[column][i] for i in selected]
+                for column in self.source.data
+            }
+        )
+        self.highlight = self.p.multi_line(
+            xs="xs",
+            ys="ys",
+            line_color=HIGHLIGHT_COLOR,
+            line_alpha=HIGHLIGHT_ALPHA,
+            line_width=HIGHLIGHT_WIDTH,
+            source=self.highlight_source,
+            level="overlay",
+        )
+        hover = HoverTool(
+            tooltips=self.tooltips,
+            formatters={"$data_x": "datetime"},
+            line_policy="nearest",
+            renderers=[self.lines],
+        )
         self.p.add_tools(hover)
-        self.p.legend.visible = False
 
 
 def plot_time_series(ts_cases_data, ts_new_case_data, grouping="Zip"):
@@ -215,57 +247,51 @@ def plot_time_series(ts_cases_data, ts_new_case_data, grouping="Zip"):
         y="Cases",
         ylabel="Total cases",
         tooltips=[
-            ("Date", "@formatted_date"),
-            ("Cases", "@Cases"),
+            ("Date", "$data_x{%F}"),
+            ("Cases", "$data_y{0}"),
             ("City", "@City"),
         ],
         title="Daily Cases by %s" % title,
     )
-    tsp_cases.plot(grouping)
+    tsp_cases.plot(grouping, highlight=default)
 
     tsp_new_cases = TSplot(
         ts_new_case_data,
         y="increase",
         ylabel="New cases",
         tooltips=[
-            ("Date", "@formatted_date"),
-            ("New cases", "@increase"),
+            ("Date", "$data_x{%F}"),
+            ("New cases", "$data_y{0}"),
             ("City", "@City"),
         ],
         title="Daily New Cases by %s" % title,
     )
-    tsp_new_cases.plot(grouping)
+    tsp_new_cases.plot(grouping, highlight=default)
 
     code = """
-        var highlight = cb_obj.value.toString()
+        var highlight = cb_obj.value.toString();
         console.log('Selected: ' + highlight);
-        var i;
-        for (i = 0; i < cases_lines.length; i++){
-            var cases_line = cases_lines[i];
-            var new_cases_line = new_cases_lines[i];
-            PaintLine(cases_line);
-            PaintLine(new_cases_line);
-        } 
-        
-        function PaintLine(line){
-            if (line.name == highlight){
-                console.log('Found: ' + line.name);
-                line.glyph.line_alpha = 0.7;
-                line.glyph.line_color = 'red';
-                line.glyph.line_width = 5;
-                line.level = 'overlay';
-            }else{
-                line.glyph.line_alpha = 0.3;
-                line.glyph.line_color = 'lightgray';
-                line.glyph.line_width = 1;
-                line.level = 'underlay';
-            }
-            line.change.emit();
+        CopyLine(cases_source, cases_highlight, cases_index[highlight]);
+        CopyLine(new_cases_source, new_cases_highlight, new_cases_index[highlight]);
+
+        function CopyLine(source, highlight_source, i){
+            var data = {};
+            Object.keys(source.data).forEach(function(column){
+                data[column] = i === undefined ? [] : [source.data[column][i]];
+            });
+            highlight_source.data = data;
         }
     """
 
     callback = CustomJS(
-        args=dict(cases_lines=tsp_cases.lines, new_cases_lines=tsp_new_cases.lines),
+        args=dict(
+            cases_source=tsp_cases.source,
+            cases_highlight=tsp_cases.highlight_source,
+            cases_index=tsp_cases.index,
+            new_cases_source=tsp_new_cases.source,
+            new_cases_highlight=tsp_new_cases.highlight_source,
+            new_cases_index=tsp_new_cases.index,
+        ),
         code=code,
     )
     select = Select(title=title, options=options, value=default)
@@ -0,0 +1,118 @@
+import gzip
+import os
+import re
+from contextlib import ExitStack, closing
+
+from .utils import COVIDerror, logger
+
+CHUNK_SIZE = 1 << 20  # 1 MiB
+HEADER_SIZE = 1024  # only the start of the file is searched for the doctype
+DOCTYPE = re.compile(rb"<!DOCTYPE html>\s*", re.IGNORECASE)
+LINE_BREAK = re.compile(rb"[ \t\r]*\n[ \t\r]*")
+
+
+class _Brotli:
+    """
+    file-like writer for brotli compression (needs the brotli package)
+    """
+
+    def __init__(self, filename):
+        try:
+            import brotli
+        except ImportError:
+            raise COVIDerror("brotli compression needs the brotli package")
+        self.compressor = brotli.Compressor()
+        self.out = open(filename, "wb")
+
+    def write(self, data):
+        self.out.write(self.compressor.process(data))
+
+    def close(self):
+        self.out.write(self.compressor.finish())
+        self.out.close()
+
+
+def _open_output(filename, compression=None):
+    if compression == "gzip":
+        # no timestamp in the header, so the same html gives the same file
+        return gzip.GzipFile(filename, "wb", mtime=0)
+    if compression == "br":
+        return _Brotli(filename)
+    if compression is None:
+        return open(filename, "wb")
+    raise COVIDerror("Unknown compression: %s" % compression)
+
+
+def _read_chunks(html):
+    """
+    chunks of the html file, with the doctype removed from the header
+    """
+    header = b""
+    for chunk in iter(lambda: html.read(CHUNK_SIZE), b""):
+        if header is None:
+            yield chunk
+            continue
+        header += chunk
+        if len(header) >= HEADER_SIZE:
+            yield DOCTYPE.sub(b"", header, count=1)
+            header = None
+    if header:
+        yield DOCTYPE.sub(b"", header, count=1)
+
+
+def _strip_lines(lines):
+    """
+    strip the whitespace around each line, for lines that start with a line break
+    """
+    return LINE_BREAK.sub(b"\n", lines).rstrip(b" \t\r")[1:] + b"\n"
+
+
+def strip_doctype(html_file, out_file, strip_lines=True, compress=()):
+    """
+    copy a html file in chunks, dropping <!DOCTYPE html> from the header so that
+    the page can be included into another page
+
+    :param html_file (str): input html
+    :param out_file (str): output html
+    :param strip_lines (bool): remove whitespace around each line (for markdown pages)
+    :param compress (tuple): also write pre-compressed copies, "gzip" (out_file.gz)
+        and/or "br" (out_file.br)
+    """
+    suffixes = {"gzip": ".gz", "br": ".br"}
+    outputs = [(out_file, None)] + [
+        (out_file + suffixes.get(compression, ""), compression)
+        for compression in compress
+    ]
+    out_bytes = 0
+    with open(html_file, "rb") as html, ExitStack() as stack:
+        outs = [
+            stack.enter_context(closing(_open_output(filename + ".tmp", compression)))
+            for filename, compression in outputs
+        ]
+
+        def write(data):
+            for out in outs:
+                out.write(data)
+            return len(data)
+
+        # the last partial line (from its line break) is kept for the next chunk,
+        # starting with the line break so that the whitespace after it is stripped
+        rest = b"\n"
+        for chunk in _read_chunks(html):
+            if not strip_lines:
+                out_bytes += write(chunk)
+                continue
+            chunk = rest + chunk
+            last_break = chunk.rfind(b"\n")
+            if last_break > 0:
+                out_bytes += write(_strip_lines(chunk[:last_break]))
+            rest = chunk[last_break:]
+        if strip_lines and rest != b"\n":
+            out_bytes += write(_strip_lines(rest))
+
+    for filename, _ in outputs:
+        os.replace(filename + ".tmp", filename)
+    logger.info(
+        "Written %i bytes from %i bytes to %s"
+        % (out_bytes, os.path.getsize(html_file), out_file)
+    )
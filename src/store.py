@@ -0,0 +1,152 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from .utils import logger
+
+STORE_FILE = "cases.npz"
+MISSING = -1
+
+
+def read_tsv(tsv_file):
+    """
+    read one day of zip code cases (e.g. data/2020-04-12.tsv)
+
+    :param tsv_file (str): tab-separated file with lines like "20850\t120 Cases"
+    :return: (zip codes, cases) as numpy arrays
+    """
+    day = pd.read_csv(
+        tsv_file,
+        names=["Zip", "Cases"],
+        sep="\t",
+        dtype={"Zip": "int64", "Cases": "str"},
+    )
+    cases = day.Cases.str.replace(" Cases", "").astype(int)
+    return day.Zip.to_numpy(), cases.to_numpy(dtype=np.int32)
+
+
+class CaseStore:
+    """
+    A zip x date matrix of case counts, consolidated from the daily tsv files
+
+    The daily tsv files stay as the source of truth, the matrix is saved next to them
+    (data/cases.npz) and only the new/modified tsv files are re-read on update.
+    Zip codes missing from a day are stored as -1.
+    """
+
+    def __init__(self, data_path):
+        self.data_path = data_path
+        self.store_file = os.path.join(data_path, STORE_FILE)
+        self.zips = np.array([], dtype=np.int64)
+        self.dates = np.array([], dtype="U10")
+        self.cases = np.empty((0, 0), dtype=np.int32)
+        self.stamps = np.empty((0, 2), dtype=np.int64)  # (size, mtime_ns) per date
+
+    def load(self):
+        """
+        read the consolidated matrix from disk, if there's one
+        """
+        if os.path.isfile(self.store_file):
+            with np.load(self.store_file) as store:
+                self.zips = store["zips"]
+                self.dates = store["dates"]
+                self.cases = store["cases"]
+                self.stamps = store["stamps"]
+            logger.info(
+                "Loaded %s (%i zips x %i days)"
+                % (self.store_file, self.zips.size, self.dates.size)
+            )
+
+    def save(self):
+        tmp_file = self.store_file + ".tmp"
+        with open(tmp_file, "wb") as store:
+            np.savez(
+                store,
+                zips=self.zips,
+                dates=self.dates,
+                cases=self.cases,
+                stamps=self.stamps,
+            )
+        os.replace(tmp_file, self.store_file)
+        logger.info("Written %s" % self.store_file)
+
+    def tsv_files(self):
+        """
+        :return: dict of date -> tsv file for every tsv file in the data directory
+        """
+        data_files = glob.glob(os.path.join(self.data_path, "*.tsv"))
+        return {os.path.basename(tsv).replace(".tsv", ""): tsv for tsv in data_files}
+
+    def update(self):
+        """
+        sync the matrix with the tsv files: read the new or modified days,
+        and drop days that no longer have a tsv file
+
+        :return: number of days read from tsv files
+        """
+        self.load()
+        tsv_files = self.tsv_files()
+        stamps = {}
+        for date, tsv in tsv_files.items():
+            stat = os.stat(tsv)
+            stamps[date] = (stat.st_size, stat.st_mtime_ns)
+
+        known = {
+            date: tuple(stamp) for date, stamp in zip(self.dates, self.stamps.tolist())
+        }
+        to_read = sorted(date for date in stamps if known.get(date) != stamps[date])
+        removed = set(known) - set(stamps)
+        if not to_read and not removed:
+            return 0
+
+        new_days = {date: read_tsv(tsv_files[date]) for date in to_read}
+        dates = np.array(sorted(stamps), dtype="U10")
+        zips = np.unique(
+            np.concatenate(
+                [self.zips] + [day_zips for day_zips, _ in new_days.values()]
+            )
+        )
+        cases = np.full((zips.size, dates.size), MISSING, dtype=np.int32)
+
+        # copy over the days that are already in the store
+        kept = np.isin(self.dates, dates) & ~np.isin(self.dates, to_read)
+        if kept.any():
+            rows = np.searchsorted(zips, self.zips)
+            cols = np.searchsorted(dates, self.dates[kept])
+            cases[rows[:, None], cols] = self.cases[:, kept]
+
+        for date, (day_zips, day_cases) in new_days.items():
+            col = np.searchsorted(dates, date)
+            cases[np.searchsorted(zips, day_zips), col] = day_cases
+
+        # zip codes that only showed up in removed days
+        observed = (cases != MISSING).any(axis=1)
+        self.zips = zips[observed]
+        self.cases = cases[observed]
+        self.dates = dates
+        self.stamps = np.array(
+            [stamps[date] for date in dates], dtype=np.int64
+        ).reshape(-1, 2)
+        logger.info(
+            "Read %i new/modified tsv files, dropped %i days"
+            % (len(to_read), len(removed))
+        )
+        self.save()
+        return len(to_read)
+
+    def to_frame(self):
+        """
+        long format of the matrix, with only zip codes reported on each day
+
+        :return: pandas.DataFrame with columns Zip, Cases and Date
+        """
+        date_index, zip_index = np.nonzero(self.cases.T != MISSING)
+        return pd.DataFrame(
+            {
+                "Zip": pd.array(self.zips[zip_index], dtype="Int64"),
+                "Cases": self.cases[zip_index, date_index].astype(int),
+                "Date": pd.to_datetime(self.dates, format="%Y-%m-%d")[date_index],
+            }
+        )
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+
+def forward_fill(cases):
+    """
+    forward fill NaN along the dates (columns) of a zip x date matrix,
+    leading NaN are kept
+
+    :param cases (numpy.ndarray): 2D float array
+    """
+    observed = ~np.isnan(cases)
+    last_observed = np.where(observed, np.arange(cases.shape[1]), 0)
+    np.maximum.accumulate(last_observed, axis=1, out=last_observed)
+    return np.take_along_axis(cases, last_observed, axis=1)
+
+
+class CaseMatrix:
+    """
+    cumulative cases as a zip x date matrix, NaN where a zip code is not reported
+    """
+
+    def __init__(self, zips, dates, cases):
+        self.zips = zips
+        self.dates = dates
+        self.cases = cases
+
+    @classmethod
+    def from_frame(cls, zip_covid):
+        """
+        :param zip_covid (pandas.DataFrame): long format with columns Zip, Date and Cases
+        """
+        zips, zip_index = np.unique(
+            zip_covid.Zip.to_numpy(dtype=np.int64), return_inverse=True
+        )
+        dates, date_index = np.unique(
+            zip_covid.Date.to_numpy(dtype="datetime64[ns]"), return_inverse=True
+        )
+        cases = np.full((zips.size, dates.size), np.nan)
+        cases[zip_index, date_index] = zip_covid.Cases.to_numpy(dtype=float)
+        return cls(zips, dates, cases)
+
+    @classmethod
+    def from_wide(cls, zips, dates, cases, zip_aliases=None):
+        """
+        :param zips (numpy.ndarray): zip code of each row of cases
+        :param dates (numpy.ndarray): date of each column of cases
+        :param cases (numpy.ndarray): 2D cases of the zip codes and dates
+        :param zip_aliases (dict): zip code -> zip code that it is counted as,
+            the rows of the same zip code are summed
+        """
+        for zip_code, alias in (zip_aliases or {}).items():
+            zips = np.where(zips == zip_code, alias, zips)
+        zips, zip_index = np.unique(zips, return_inverse=True)
+        # sum the rows of each zip code, as consecutive rows
+        zip_order = np.argsort(zip_index, kind="stable")
+        starts = np.searchsorted(zip_index[zip_order], np.arange(zips.size))
+        date_order = np.argsort(dates, kind="stable")
+        summed = np.add.reduceat(cases[zip_order][:, date_order], starts, axis=0)
+        return cls(zips, dates[date_order], summed.astype(float))
+
+    def reindex_dates(self):
+        """
+        add the missing days between the first and the last date as unreported
+
+        :return: a new CaseMatrix with one column per day
+        """
+        dates = pd.date_range(self.dates[0], self.dates[-1], freq="D").to_numpy()
+        cases = np.full((self.zips.size, dates.size), np.nan)
+        cases[:, np.searchsorted(dates, self.dates)] = self.cases
+        return CaseMatrix(self.zips, dates, cases)
+
+    def to_frame(self, filled=True):
+        """
+        long format of the matrix, zip codes are dropped before they are first reported
+
+        :param filled (bool): forward fill the days a zip code is not reported
+        :return: pandas.DataFrame with columns Zip, Cases and Date, sorted by Zip and Date
+        """
+        cases = self.filled() if filled else self.cases
+        zip_index, date_index = np.nonzero(~np.isnan(cases))
+        return pd.DataFrame(
+            {
+                "Zip": self.zips[zip_index],
+                "Cases": cases[zip_index, date_index],
+                "Date": self.dates[date_index],
+            }
+        )
+
+    def filled(self):
+        """
+        cases carried forward over the days a zip code is not reported
+        """
+        return forward_fill(self.cases)
+
+    def daily_increase(self):
+        """
+        day over day increase, NaN until the second reported day of a zip code
+        """
+        filled = self.filled()
+        increase = np.full_like(filled, np.nan)
+        increase[:, 1:] = filled[:, 1:] - filled[:, :-1]
+        return increase
+
+    def rolling_increase(self, window=7):
+        """
+        sum of the daily increase over the last ``window`` days
+        """
+        total = np.cumsum(np.nan_to_num(self.daily_increase()), axis=1)
+        rolled = total.copy()
+        rolled[:, window:] -= total[:, :-window]
+        return np.where(np.isnan(self.filled()), np.nan, rolled)
+
+    def latest_increase(self):
+        """
+        case changes between the last two reported days of the zip codes
+        reported on the latest date (0 if it's the first report of the zip code)
+
+        :return: pandas.DataFrame with columns Zip and increase
+        """
+        reported = ~np.isnan(self.cases[:, -1])
+        increase = np.nan_to_num(np.abs(self.daily_increase()[reported, -1]))
+        return pd.DataFrame({"Zip": self.zips[reported], "increase": increase})
+
+
+def time_series(zip_covid, zip_map):
+    """
+    daily cases of each zip code, forward filled over the days it is not reported
+
+    :param zip_covid (pandas.DataFrame): long format with columns Zip, Date and Cases
+    :param zip_map (pandas.DataFrame): zip code to city table with columns Zip and City
+    :return: pandas.DataFrame with columns Zip, Cases, Date, City and formatted_date
+    """
+    return (
+        CaseMatrix.from_frame(zip_covid)
+        .reindex_dates()
+        .to_frame(filled=True)
+        .assign(Cases=lambda d: d.Cases.astype(int))
+        .merge(zip_map.filter(["Zip", "City"]), on="Zip")
+        .assign(formatted_date=lambda d: d.Date.dt.strftime("%Y-%m-%d"))
+    )
@@ -1,6 +1,5 @@
 import datetime
 import os
-import sys
 
 import geopandas as gpd
 import numpy as np
@@ -9,10 +8,16 @@ from bokeh.io import output_file, save
 from bokeh.layouts import column
 from bokeh.models.widgets import Panel, Tabs
 
+from .assets import externalize
+from .check import check_update  # noqa: F401
+from .geometry import city_shapes
+from .instrument import report, timed
+from .manifest import Manifest, tsv_checksums
 from .plotting import PLOT_HEIGHT, PLOT_WIDTH, plot_map, plot_time_series
 from .utils import Data, get_data, logger, markdown_html
 
 today = datetime.date.today()
+MANIFEST_FILE = "derived.json"
 
 
 def is_updated(filename):
@@ -28,71 +33,105 @@ def is_updated(filename):
         return False
 
 
-def ts_plots(ts_data_file):
-    # read time series data and plot
-    ts_data = (
-        pd.read_csv(ts_data_file)
-        .assign(Date=lambda d: pd.to_datetime(d.Date))
-        .assign(Zip=lambda d: d.Zip.astype(str))
-    )
+@timed
+def ts_plots(ts_data):
+    """
+    plot time series
+
+    :param ts_data: time series data frame from get_data, or the csv file of it
+    """
+    if isinstance(ts_data, str):
+        ts_data = pd.read_csv(ts_data).assign(Date=lambda d: pd.to_datetime(d.Date))
+    ts_data = ts_data.assign(Zip=lambda d: d.Zip.astype(str))
+    report.count(len(ts_data))
     new_zip_df = ts_data.assign(
         increase=lambda d: d.groupby("Zip").Cases.transform(lambda x: x - np.roll(x, 1))
     ).query("increase>=0")
     zip_ts_plot = plot_time_series(ts_data, new_zip_df, grouping="Zip")
 
-    city_df = ts_data.groupby(["City", "Date", "formatted_date"], as_index=False).agg(
-        {"Cases": "sum"}
-    )
+    city_df = ts_data.groupby(
+        ["City", "Date", "formatted_date"], as_index=False, observed=True
+    ).agg({"Cases": "sum"})
     new_city_df = new_zip_df.groupby(
-        ["City", "Date", "formatted_date"], as_index=False
+        ["City", "Date", "formatted_date"], as_index=False, observed=True
     ).agg({"Cases": "sum", "increase": "sum"})
     city_ts_plot = plot_time_series(city_df, new_city_df, grouping="City")
     return zip_ts_plot, city_ts_plot
 
 
-def map_plots(map_data_file):
-    # read map data and plot
-    map_df = gpd.read_file(map_data_file).rename(
-        columns={"per_population": "Total", "increase": "Daily"}
-    )
+@timed
+def map_plots(map_df, cache_dir=None):
+    """
+    plot zip code and city maps, the city shapes are dissolved from the zip code shapes
+
+    :param map_df: map geo data frame from get_data, or the geojson file of it
+    :param cache_dir (str): directory for caching the city shapes
+        (default: directory of the geojson file; no caching for data frame input)
+    """
+    if isinstance(map_df, str):
+        cache_dir = cache_dir or os.path.dirname(os.path.abspath(map_df))
+        map_df = gpd.read_file(map_df)
+    map_df = map_df.rename(columns={"per_population": "Total", "increase": "Daily"})
+    report.count(len(map_df))
     today = str(map_df.Date.astype(str).unique()[0]).split("T")[0]
     zip_map_plot = plot_map(map_df, with_zip=True, today=today)
 
-    map_df = (
-        gpd.read_file("data/MD.geojson")
-        .rename(columns={"per_population": "Total", "increase": "Daily"})
-        .drop("Zip", axis=1)
+    city_df = (
+        map_df.filter(["City", "State", "Cases", "Population", "Daily"])
         .assign(Population=lambda d: d.Population.astype(float))
-        .dissolve(by=["City", "State"], aggfunc="sum")
+        .groupby(["City", "State"], as_index=False)
+        .sum()
         .assign(Total=lambda d: d.Cases / d.Population)
-        .assign(per_populatin_increase=lambda d: d.Daily / d.Population)
-        .reset_index()
+        .assign(per_population_increase=lambda d: d.Daily / d.Population)
+    )
+    city_map_df = city_shapes(map_df, cache_dir=cache_dir).merge(
+        city_df, on=["City", "State"]
     )
-    city_map_plot = plot_map(map_df, with_zip=False, today=today)
+    city_map_plot = plot_map(city_map_df, with_zip=False, today=today)
     return zip_map_plot, city_map_plot
 
 
 def update_data(args, ts_data_file, map_data_file):
     """
-    write new data to file
+    write new data to file, if the daily tsv files or the output files are changed
+    since the last run (recorded in datadir/derived.json), or if the output files
+    are not created today when using MD opendata
+
+    :return: (time series data frame, map geo data frame) if the data is updated,
+        otherwise (None, None)
     """
-    if not is_updated(ts_data_file) or not is_updated(map_data_file) or args.refresh:
+    manifest_file = None
+    if args.datadir:
+        manifest_file = os.path.join(args.datadir, MANIFEST_FILE)
+        updated = Manifest(manifest_file).is_current(
+            tsv_checksums(args.datadir), {"ts": ts_data_file, "map": map_data_file}
+        )
+    else:
+        updated = is_updated(ts_data_file) and is_updated(map_data_file)
+
+    if not updated or args.refresh:
         logger.info("Updating data: %s" % str(today))
         # daily update!!
-        get_data(
+        return get_data(
             ts_data_file=ts_data_file,
             map_data_file=map_data_file,
             datadir=args.datadir,
+            manifest_file=manifest_file,
         )
+    logger.info("Data is up to date")
+    return None, None
 
 
+@timed
 def update(args, get_app=False):
     logger.info("Updating dashboard")
     ts_data_file = args.datadir + "/ts.csv"
     map_data_file = args.datadir + "/MD.geojson"
-    update_data(args, ts_data_file, map_data_file)
-    zip_ts_plot, city_ts_plot = ts_plots(ts_data_file)
-    zip_map_plot, city_map_plot = map_plots(map_data_file)
+    ts_data, map_df = update_data(args, ts_data_file, map_data_file)
+    if ts_data is None:
+        ts_data, map_df = ts_data_file, map_data_file
+    zip_ts_plot, city_ts_plot = ts_plots(ts_data)
+    zip_map_plot, city_map_plot = map_plots(map_df, cache_dir=args.datadir)
 
     # combined figure
     Zip_panel = Panel(
@@ -115,15 +154,18 @@ def update(args, get_app=False):
     if not get_app:
         html_file = args.out_html
         output_file(html_file)
-        save(dashboard)
+        asset_dir = getattr(args, "data_assets", None)
+        with report.stage("save"):
+            if asset_dir:
+                # data-driven page: the data files are fetched by the page
+                html_dir = os.path.dirname(os.path.abspath(html_file))
+                data_url = getattr(args, "data_url", None) or os.path.relpath(
+                    asset_dir, html_dir
+                )
+                save(
+                    dashboard, template=externalize(dashboard, asset_dir, url=data_url)
+                )
+            else:
+                save(dashboard)
     else:
         return dashboard
-
-
-def check_update():
-    logger.info("Checking database")
-    dat = Data()
-    dat.read_zip_COVID()
-    dat.zip_covid.pipe(lambda d: d[d.Date == d.Date.max()]).query("Cases > 0").assign(
-        Cases=lambda d: d.Cases.astype(int).astype(str) + " Cases"
-    ).to_csv(sys.stdout, index=False, sep="\t", header=False)
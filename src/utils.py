@@ -1,15 +1,16 @@
+import datetime
 import glob
+import hashlib
 import logging
 import os
-import sys
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 
-import geopandas as gpd
 import numpy as np
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup
-from tqdm import tqdm
+
+from .instrument import report, timed
+from .timeseries import CaseMatrix, time_series
 
 logging.basicConfig(
     level=logging.INFO,
@@ -18,12 +19,101 @@ logging.basicConfig(
 )
 logger = logging.getLogger("COVID19")
 cwd = os.path.dirname(os.path.abspath(__file__))
+FIRST_DAY = datetime.date(2020, 4, 12)  # first day of the MD zip code data
+# (min lon, min lat, max lon, max lat) for reading only nearby zip code shapes
+STATE_BBOX = {"MD": (-79.5, 37.85, -75.0, 39.75)}
+SIMPLIFY_TOLERANCE = 0.0005  # degrees, about 50 meters, less than a pixel on the map
+COORDINATE_PRECISION = 4  # decimal places, about 10 meters
+CASE_DTYPES = {"Zip": "uint32", "Cases": "int32"}  # Date: see compact_cases
+ZIP_ALIASES = {21802: 21804}  # zip codes in MD opendata that are counted as another
+MAP_COLUMNS = [
+    "Zip",
+    "City",
+    "State",
+    "Cases",
+    "Date",
+    "geometry",
+    "Population",
+    "per_population",
+    "increase",
+    "per_population_increase",
+]
 
 
 class COVIDerror(Exception):
     pass
 
 
+def file_checksum(filename, block_size=1 << 20):
+    """
+    sha1 hex digest of a file
+
+    :param filename (str): file path
+    :param block_size (int): bytes to read at a time
+    """
+    sha1 = hashlib.sha1()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def remove_stale(cache_file, pattern):
+    """
+    remove the older versions of a cache file, after writing a new one
+
+    :param cache_file (str): the new cache file, which is kept
+    :param pattern (str): glob pattern of all the versions of the cache file
+    """
+    for stale_file in glob.glob(pattern):
+        if os.path.abspath(stale_file) != os.path.abspath(cache_file):
+            os.remove(stale_file)
+            logger.info("Removed stale %s" % stale_file)
+
+
+def compact_cases(zip_covid):
+    """
+    the compact schema of the long format cases: uint32 Zip, int32 Cases, and Date as
+    ordered categories of every day from FIRST_DAY, so that the codes are day offsets
+    from FIRST_DAY (int16 for up to 89 years), and Date still works as dates
+    (e.g. Date.max())
+
+    :param zip_covid (pandas.DataFrame): long format with columns Zip, Date and Cases
+    """
+    dates = pd.to_datetime(zip_covid.Date)
+    first_day = pd.Timestamp(FIRST_DAY)
+    if dates.min() < first_day:
+        raise COVIDerror(
+            "Data before the first day (%s): %s" % (first_day, dates.min())
+        )
+    days = pd.date_range(first_day, dates.max(), freq="D")
+    return zip_covid.astype(CASE_DTYPES).assign(
+        Date=pd.Categorical.from_codes(
+            (dates - first_day).dt.days.astype("int16"),
+            categories=days,
+            ordered=True,
+        )
+    )
+
+
+def memory_report(frames):
+    """
+    log the memory used by each data frame
+
+    :param frames (dict): name -> data frame
+    :return: dict of name -> bytes
+    """
+    report = {
+        name: int(frame.memory_usage(index=True, deep=True).sum())
+        for name, frame in frames.items()
+        if frame is not None
+    }
+    for name, size in report.items():
+        logger.info("Memory: %s %.2f MiB" % (name, size / (1 << 20)))
+    logger.info("Memory: total %.2f MiB" % (sum(report.values()) / (1 << 20)))
+    return report
+
+
 class DataUrls(Enum):
     zip_to_city_broken = (
         "https://public.opendatasoft.com/explore/dataset/us-zip-code-latitude-and-longitude"
@@ -46,17 +136,40 @@ class DataUrls(Enum):
         "https://services.arcgis.com/njFNhDsUCentVYJW/arcgis/rest/services/MDCOVID19_MASTER_ZIP_CODE_CASES"
         "/FeatureServer/0/query?where=1%3D1&outFields=*&outSR=4326&f=json"
     )
+    zip_covid_layer = (
+        "https://services.arcgis.com/njFNhDsUCentVYJW/arcgis/rest/services/MDCOVID19_MASTER_ZIP_CODE_CASES"
+        "/FeatureServer/0"
+    )
 
 
 class Data:
-    def __init__(self, state="MD", datadir="./data"):
+    def __init__(
+        self,
+        state="MD",
+        datadir="./data",
+        simplify_tolerance=SIMPLIFY_TOLERANCE,
+        coordinate_precision=COORDINATE_PRECISION,
+        cache_dir=None,
+        fixture_dir=None,
+        zip_aliases=ZIP_ALIASES,
+    ):
+        from .fetch import FetchCache
+
         # data and URL path
         self.state = state
         self.data_path = datadir
+        self.simplify_tolerance = simplify_tolerance
+        self.coordinate_precision = coordinate_precision
+        self.zip_aliases = zip_aliases
+        # downloads of the reference data (cache_dir default: <datadir>/cache)
+        self.cache = FetchCache(
+            cache_dir or os.path.join(datadir, "cache"), fixture_dir=fixture_dir
+        )
         self.zip_map_url = DataUrls.zip_to_city.value
         self.population_url = DataUrls.maryland_zip_population.value
         self.geo_shape_url = DataUrls.geoshape.value
         self.MD_zip_data_url = DataUrls.zip_covid_data.value
+        self.MD_zip_layer_url = DataUrls.zip_covid_layer.value
 
         # actual reading dat
         self.geo = None
@@ -64,142 +177,213 @@ class Data:
         self.zip_covid = None
         self.zip_population = None
 
-    def get(self, use_db=False):
+    @timed
+    def get(self, use_db=False, parallel=False):
         """
         fill in data
+
+        :param use_db (bool): read the cases from MD opendata instead of the tsv files
+        :param parallel (bool): read the cases, the zip codes with their shapes and the
+            population in threads; if more than one of them fails, the error of the
+            first one (in this order) is raised and the others are logged
+        """
+        steps = [
+            self.read_zip_COVID_web if use_db else self.read_zip_COVID,
+            self.read_zip_shapes,
+            self.read_population,
+        ]
+        if not parallel:
+            for step in steps:
+                step()
+            return
+
+        stage = report.current()  # the steps are stages inside the stage of get
+        with ThreadPoolExecutor(max_workers=len(steps)) as pool:
+            futures = [pool.submit(report.within, stage, step) for step in steps]
+        errors = [future.exception() for future in futures if future.exception()]
+        for error in errors[1:]:
+            logger.error("Also failed: %r" % error)
+        if errors:
+            raise errors[0]
+
+    def read_zip_shapes(self):
+        """
+        zip code to city table, and then the shapes of these zip codes
         """
-        if use_db:
-            self.read_zip_COVID_web()
-        else:
-            self.read_zip_COVID()
-        self.read_map()
         self.read_zip_map()
         self.zip_codes = self.zip_map.Zip
-        self.read_population()
+        self.read_map()
+
+    def memory_report(self):
+        """
+        log the memory used by the data tables (see memory_report)
+        """
+        return memory_report(
+            {
+                "zip_covid": self.zip_covid,
+                "zip_map": self.zip_map,
+                "geo": self.geo,
+                "zip_population": self.zip_population,
+            }
+        )
 
     def _download(self, zipfile):
-        logger.info("Downloading: %s to %s" % (self.geo_shape_url, zipfile))
-        r = requests.get(self.geo_shape_url, stream=True)
-        total_size = int(r.headers.get("content-length", 0))
-        block_size = 1024  # 1 Kibibyte
-        t = tqdm(total=total_size, unit="iB", unit_scale=True)
-        with open(zipfile, "wb") as zf:
-            for data in r.iter_content(block_size):
-                t.update(len(data))
-                zf.write(data)
-        t.close()
-        if total_size == 0 and t.n != total_size:
-            logger.error("Failed downloading")
-            sys.exit()
-        else:
-            logger.info("Downloaded %s" % zipfile)
+        from .fetch import download_file, verify_zip
+
+        # no published checksum of the shapes, so the CRCs of the zip are checked
+        download_file(self.geo_shape_url, zipfile, verify=verify_zip)
 
     def download_zipfile(self, zipfile):
         """
-        get the zip file for geo information
+        get the zip file for geo information, and extract only the shapefile
         """
-        self._download(zipfile)
-        command = "unzip %s -d %s" % (zipfile, self.data_path)
-        logger.info(command)
-        os.system(command)
-        logger.info("unzipped %s" % zipfile)
+        from .fetch import extract_members
 
+        if not os.path.isfile(zipfile):
+            self._download(zipfile)
+        extract_members(zipfile, self.data_path)
+
+    @timed
     def read_map(self):
         """
         read geoshape of zip codes
+
+        The simplified shapes in the state's bounding box are cached in a small
+        geopackage file (e.g. data/tl_2019_us_zcta510.MD.<stamp>.t0.0005p4.gpkg, with
+        a stamp of the size and modification time of the shapefile), so the nation-wide
+        shapefile is only parsed once, and the shapes are then filtered to the zip codes
+        of the zip code to city map. Without a bounding box, the cached shapes are
+        those of the zip codes in the map, which are part of the stamp.
         """
+        import geopandas as gpd
+
+        from .geometry import simplify
+
         zipfile = self.data_path + "/tl_2019_us_zcta510.zip"
         shapefile = zipfile.replace(".zip", ".shp")
         if not os.path.isfile(shapefile):
             self.download_zipfile(zipfile)
-        # out = gpd.read_file('zip://' + zipfile) \
-        self.geo = (
-            gpd.read_file(shapefile)
-            .rename(columns={"ZCTA5CE10": "Zip"})
-            .assign(Zip=lambda d: d.Zip.astype(int))
+        bbox = STATE_BBOX.get(self.state)
+        stat = os.stat(shapefile)
+        stamp = hashlib.sha1(b"%i:%i" % (stat.st_size, stat.st_mtime_ns))
+        if bbox is None and self.zip_map is not None:
+            stamp.update(np.sort(self.zip_map.Zip.to_numpy()).tobytes())
+        cache_file = shapefile.replace(
+            ".shp",
+            ".%s.%s.t%sp%s.gpkg"
+            % (
+                self.state,
+                stamp.hexdigest()[:12],
+                self.simplify_tolerance,
+                self.coordinate_precision,
+            ),
         )
-        logger.info("Loaded geo shape")
+        if os.path.isfile(cache_file):
+            geo = gpd.read_file(cache_file)
+            logger.info("Loaded geo shape from %s" % cache_file)
+        else:
+            # out = gpd.read_file('zip://' + zipfile) \
+            geo = (
+                gpd.read_file(shapefile, bbox=bbox)
+                .rename(columns={"ZCTA5CE10": "Zip"})
+                .assign(Zip=lambda d: d.Zip.astype(int))
+            )
+            logger.info("Loaded geo shape")
+            if bbox is None and self.zip_map is not None:
+                geo = geo[geo.Zip.isin(self.zip_map.Zip)]
+            geo = simplify(
+                geo,
+                tolerance=self.simplify_tolerance,
+                precision=self.coordinate_precision,
+            )
+            if bbox is not None or self.zip_map is not None:
+                geo.to_file(cache_file, driver="GPKG")
+                logger.info("Written %i zip codes to %s" % (geo.shape[0], cache_file))
+                remove_stale(
+                    cache_file, shapefile.replace(".shp", ".%s.*.gpkg" % self.state)
+                )
+        if self.zip_map is not None:
+            geo = geo[geo.Zip.isin(self.zip_map.Zip)].reset_index(drop=True)
+        self.geo = geo
+        report.count(len(self.geo))
 
+    @timed
     def read_zip_COVID_web(self):
         """
-        cases count per zip code per day
+        cases count per zip code per day, only the zip code and the daily case
+        fields are downloaded
         """
+        from .arcgis import FeatureServer, case_dates
+
+        layer = FeatureServer(self.MD_zip_layer_url)
+        fields = layer.case_fields()
+        table = layer.query(["ZIP_CODE"] + fields).pipe(
+            lambda d: d[~pd.isnull(d.ZIP_CODE)]
+        )
+        # unreported cases count as 0
         self.zip_covid = (
-            gpd.read_file(self.MD_zip_data_url)
-            .pipe(lambda d: d[~pd.isnull(d.ZIP_CODE)])
-            .drop(["OBJECTID", "geometry"], axis=1)
-            .pipe(pd.DataFrame)
-            .pipe(
-                pd.melt,
-                id_vars=["ZIP_CODE"],
-                var_name="Date",
-                value_name="Cases",
+            CaseMatrix.from_wide(
+                table.ZIP_CODE.astype(int).to_numpy(),
+                case_dates(fields),
+                np.nan_to_num(table[fields].to_numpy(dtype=float)),
+                zip_aliases=self.zip_aliases,
             )
-            .assign(Cases=lambda d: d.Cases.fillna(0))
-            .assign(
-                Date=lambda d: d.Date.str.extract(
-                    "([0-9]+_[0-9]+_[0-9]+)$", expand=False
-                )
-            )
-            .assign(Date=lambda d: pd.to_datetime(d.Date, format="%m_%d_%Y"))
-            .assign(ZIP_CODE=lambda d: d.ZIP_CODE.where(d.ZIP_CODE != "21802", "21804"))
-            .groupby(["ZIP_CODE", "Date"], as_index=False)
-            .agg({"Cases": "sum"})
-            .assign(ZIP_CODE=lambda d: d.ZIP_CODE.astype(int))
-            .rename(columns={"ZIP_CODE": "Zip"})
+            .to_frame(filled=False)
+            .filter(["Zip", "Date", "Cases"])
+            .pipe(compact_cases)
         )
+        report.count(len(self.zip_covid))
         min_date = str(self.zip_covid.Date.min().date())
         max_date = str(self.zip_covid.Date.max().date())
         logger.info("Loaded %s to %s" % (min_date, max_date))
 
+    @timed
     def read_zip_COVID(self):
         """
         cases count per zip code per day
         """
+        from .store import CaseStore
+
         logger.info("Using data from %s" % self.data_path)
-        covid_data = {}
-        data_files = glob.glob(self.data_path + "/*.tsv")
-        if len(data_files) == 0:
+        store = CaseStore(self.data_path)
+        store.update()
+        if store.dates.size == 0:
             raise COVIDerror("No data from %s" % self.data_path)
-        data_files.sort()
-        logger.info("Latest file: %s" % data_files[-1])
-        for i, csv in enumerate(data_files):
-            date = os.path.basename(csv.replace(".tsv", ""))
-            covid_data[date] = pd.read_csv(
-                csv,
-                names=["Zip", "Cases"],
-                sep="\t",
-                dtype={"Zip": "Int64", "Cases": "str"},
-            ).assign(Cases=lambda d: d.Cases.str.replace(" Cases", "").astype(int))
-        self.zip_covid = pd.concat(
-            date_data.assign(Date=date) for date, date_data in covid_data.items()
-        ).assign(Date=lambda d: pd.to_datetime(d.Date, format="%Y-%m-%d"))
-        logger.info("Loaded daily COVID cases (%i days)" % (i + 1))
+        logger.info("Latest file: %s" % store.tsv_files()[store.dates[-1]])
+        self.zip_covid = compact_cases(store.to_frame())
+        report.count(len(self.zip_covid))
+        logger.info("Loaded daily COVID cases (%i days)" % store.dates.size)
 
+    @timed
     def read_zip_map(self):
         """
         zip city information
+
+        The nation-wide table is split into one table per state once per download
+        (data/zip_map/<checksum>/<state>.pkl), with categorical City and State
         """
-        self.zip_map = (
-            pd.read_csv(self.zip_map_url, sep=";")
-            .rename(
-                columns={
-                    "Zip Code": "Zip",
-                    "Official USPS city name": "City",
-                    "Official USPS State Code": "State",
-                }
-            )
-            .query('State == "%s"' % self.state)
-            .filter(["Zip", "City", "State"])
+        zip_map_file = self.cache.fetch(DataUrls.zip_to_city)
+        partition_dir = os.path.join(
+            self.data_path, "zip_map", file_checksum(zip_map_file)[:12]
         )
+        if not os.path.isdir(partition_dir):
+            partition_zip_map(zip_map_file, partition_dir)
+        partition = os.path.join(partition_dir, "%s.pkl" % self.state)
+        if not os.path.isfile(partition):
+            raise COVIDerror("No zip codes for state: %s" % self.state)
+        self.zip_map = pd.read_pickle(partition)
+        report.count(len(self.zip_map))
         logger.info("Retrieved map info")
 
+    @timed
     def read_population(self):
         """
         get population data for each zip code
         """
-        http = requests.get(self.population_url)
-        soup = BeautifulSoup(http.content, features="lxml")
+        from bs4 import BeautifulSoup
+
+        with open(self.cache.fetch(DataUrls.maryland_zip_population), "rb") as html:
+            soup = BeautifulSoup(html.read(), features="lxml")
         table = soup.find_all("table")
         table = (
             pd.read_html(str(table))[0]
@@ -220,82 +404,146 @@ class Data:
             rows.append(row_dict)
         logger.info("Retrieved populations")
         self.zip_population = pd.DataFrame(rows)
+        report.count(len(self.zip_population))
+
+
+def partition_zip_map(zip_map_file, partition_dir):
+    """
+    split the nation-wide zip code to city table into one table per state
+
+    :param zip_map_file (str): csv file from DataUrls.zip_to_city
+    :param partition_dir (str): output directory, with <state>.pkl for each state
+    """
+    zip_map = pd.read_csv(
+        zip_map_file,
+        sep=";",
+        usecols=["Zip Code", "Official USPS city name", "Official USPS State Code"],
+        dtype={
+            "Official USPS city name": "category",
+            "Official USPS State Code": "category",
+        },
+    ).rename(
+        columns={
+            "Zip Code": "Zip",
+            "Official USPS city name": "City",
+            "Official USPS State Code": "State",
+        }
+    )
+    tmp_dir = partition_dir + ".tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    for state, state_zip_map in zip_map.groupby("State", observed=True):
+        state_zip_map.assign(
+            City=lambda d: d.City.cat.remove_unused_categories(),
+            State=lambda d: d.State.cat.remove_unused_categories(),
+        ).reset_index(drop=True).to_pickle(os.path.join(tmp_dir, "%s.pkl" % state))
+    os.replace(tmp_dir, partition_dir)
+    logger.info("Written %i states to %s" % (zip_map.State.nunique(), partition_dir))
 
 
 def markdown_html(html_file, out_file):
-    with open(html_file) as html, open(out_file, "w") as out_html:
-        outline = 0
-        inline = 0
-        for line in html:
-            inline += 1
-            if not "<!DOCTYPE html>" in line.strip():
-                outline += 1
-                print(line.strip(), file=out_html)
-    logger.info("Written %i lines from %i lines to %s" % (outline, inline, out_file))
+    """
+    make the dashboard html includable in a markdown page (see src.postprocess)
+    """
+    from .postprocess import strip_doctype
 
+    strip_doctype(html_file, out_file)
 
+
+@timed
 def get_data(
     ts_data_file="../data/ts.csv",
     map_data_file="../data/MD.geojson",
     datadir="./data",
+    simplify_tolerance=SIMPLIFY_TOLERANCE,
+    coordinate_precision=COORDINATE_PRECISION,
+    manifest_file=None,
+    parallel=True,
 ):
-    maryland = Data(state="MD", datadir=datadir)
+    """
+    build the time series and map data, and write them to files
+
+    With a manifest file, the checksums of the daily tsv files and of the outputs are
+    recorded, so that the next run can be skipped if none of them changed
+    (see Manifest.is_current).
+
+    :param ts_data_file (str): csv file for the time series (not written if None)
+    :param map_data_file (str): geojson file for the map
+    :param datadir (str): directory of the daily tsv files (empty string to use MD opendata)
+    :param simplify_tolerance (float): tolerance for simplifying the zip code shapes
+    :param coordinate_precision (int): decimal places to keep for the shape coordinates
+    :param manifest_file (str): json file recording the inputs of the outputs
+    :param parallel (bool): read the inputs in parallel (see Data.get)
+    :return: (time series data frame, map geo data frame)
+    """
+    from .manifest import Manifest, tsv_checksums
+
+    maryland = Data(
+        state="MD",
+        datadir=datadir,
+        simplify_tolerance=simplify_tolerance,
+        coordinate_precision=coordinate_precision,
+    )
     use_db = not datadir  # if empty string
-    maryland.get(use_db=use_db)
-    data = (
-        maryland.geo.merge(maryland.zip_map, on="Zip", how="right")
-        .merge(maryland.zip_covid, on="Zip", how="left")
+    manifest = None
+    if manifest_file and ts_data_file and not use_db:
+        manifest = Manifest(manifest_file)
+        dates = tsv_checksums(datadir)
+    maryland.get(use_db=use_db, parallel=parallel)
+    maryland.memory_report()
+
+    # cases of each zip code on the latest day, on plain zip-keyed tables;
+    # zip codes that are never reported count as 0 cases on that day
+    zip_covid = maryland.zip_covid
+    latest_date = pd.Timestamp(zip_covid.Date.max())
+    latest_cases = zip_covid.loc[zip_covid.Date == latest_date, ["Zip", "Cases"]]
+    total_case_data = (
+        maryland.zip_map.filter(["Zip", "City", "State"])
         .merge(
             maryland.zip_population.assign(Zip=lambda d: d.Zip.astype(int)),
             on="Zip",
         )
-        .assign(Date=lambda d: d.Date.fillna(d.Date.max()))
-        .filter(["Zip", "City", "State", "Cases", "Date", "geometry", "Population"])
-    )
-
-    total_case_data = (
-        data.pipe(lambda d: d[d.Date == d.Date.max()])
-        .assign(Cases=lambda d: d.Cases.fillna(0))
-        .pipe(lambda d: d[~pd.isnull(d.geometry)])
+        .merge(latest_cases, on="Zip", how="left")
+        .pipe(lambda d: d[d.Cases.notna() | ~d.Zip.isin(zip_covid.Zip)])
+        .assign(Cases=lambda d: d.Cases.fillna(0).astype(latest_cases.Cases.dtype))
+        .assign(Date=latest_date)
         .assign(per_population=lambda d: d.Cases * 1e6 / d.Population.astype(int))
+        .astype({"City": str, "State": str})
     )
 
-    per_day_increase_data = (
-        data.groupby(["Zip"], as_index=False)
-        .apply(
-            lambda d: d.nlargest(2, "Date")
-            .assign(increase=lambda d: d.Cases.max() - d.Cases.min())
-            .assign(
-                increase=lambda d: np.where(pd.isnull(d.increase), d.Cases, d.increase)
-            )
-            .assign(increase=lambda d: d.increase.fillna(0))
-            .pipe(lambda d: d[d.Date == d.Date.max()])
-        )
-        .pipe(lambda d: d[~pd.isnull(d.geometry)])
-        .assign(per_population=lambda d: d.Cases / d.Population.astype(int) * 1e6)
-        .assign(Date=lambda d: d.Date.astype(str))
-    )
+    # day over day increase on the zip x date matrix, without the geometries
+    per_day_increase_data = CaseMatrix.from_frame(maryland.zip_covid).latest_increase()
+
+    ts_data = time_series(maryland.zip_covid, maryland.zip_map)
+    if ts_data_file:
+        ts_data.to_csv(ts_data_file, index=False)
+        logger.info("Written %s" % ts_data_file)
 
-    ts_data = (
-        maryland.zip_covid.merge(maryland.zip_map.filter(["Zip", "City"]), on="Zip")
-        .groupby(["Zip", "City"], as_index=False)
-        .apply(
-            lambda d: d.sort_values("Date").assign(
-                Cases=lambda d: d.Cases.fillna(method="ffill", axis=0).fillna(0)
+    # the shapes are only joined to the final one row per zip code table
+    map_df = (
+        total_case_data.merge(per_day_increase_data, on="Zip", how="left")
+        .assign(increase=lambda d: d.increase.fillna(0))
+        .assign(
+            per_population_increase=lambda d: 1e6
+            * d["increase"].astype(int)
+            / d.Population.astype(int)
+        )
+        .pipe(
+            lambda d: maryland.geo.filter(["Zip", "geometry"]).merge(
+                d, on="Zip", how="right"
             )
         )
-        .reset_index(drop=True)
-        .assign(formatted_date=lambda d: d.Date.astype(str))
-    )
-    ts_data.to_csv(ts_data_file, index=False)
-    logger.info("Written %s" % ts_data_file)
-
-    map_df = total_case_data.merge(
-        per_day_increase_data.filter(["Zip", "increase"])
-    ).assign(
-        per_population_increase=lambda d: 1e6
-        * d["increase"].astype(int)
-        / d.Population.astype(int)
+        .pipe(lambda d: d[~pd.isnull(d.geometry)])
+        .filter(MAP_COLUMNS)
     )
+    report.count(len(ts_data))
     map_df.to_file(map_data_file, driver="GeoJSON")
     logger.info("Written %s" % map_data_file)
+
+    if manifest is not None:
+        manifest.dates = dates
+        manifest.checksums = {
+            "ts": file_checksum(ts_data_file),
+            "map": file_checksum(map_data_file),
+        }
+        manifest.save()
+    return ts_data, map_df
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pytest
+
+from src import download
+from src.arcgis import FeatureServer
+from src.check import upstream_new_dates
+from src.utils import COVIDerror, Data, compact_cases
+
+RECORDS = [
+    {
+        "OBJECTID": i + 1,
+        "ZIP_CODE": zip_code,
+        "total04_12_2020": cases,
+        "total04_13_2020": cases + 1 if cases else None,
+    }
+    for i, (zip_code, cases) in enumerate(
+        [("20850", 3), ("20851", None), ("21802", 2), ("21804", 1), ("20852", 4)]
+    )
+]
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    a FeatureServer layer at /FeatureServer/0 serving RECORDS,
+    two records per page, and recording the query parameters;
+    urls longer than MAX_URL are rejected, like ArcGIS servers do
+    """
+
+    MAX_URL = 2048
+    records = RECORDS
+    queries = []
+
+    def send_json(self, content):
+        body = json.dumps(content).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if len(self.path) > self.MAX_URL:
+            self.send_error(414)
+            return
+        url = urlparse(self.path)
+        self.respond(url.path, url.query)
+
+    def do_POST(self):
+        form = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        self.respond(urlparse(self.path).path, form)
+
+    def respond(self, path, query):
+        params = {key: values[0] for key, values in parse_qs(query).items()}
+        if path == "/FeatureServer/0":
+            self.send_json(
+                {
+                    "maxRecordCount": 2,
+                    "objectIdField": "OBJECTID",
+                    "editingInfo": {"lastEditDate": 1586736000000},
+                    "fields": [{"name": name} for name in self.records[0]],
+                }
+            )
+            return
+        self.queries.append(params)
+        fields = params["outFields"].split(",")
+        if set(fields) - set(self.records[0]):
+            self.send_json({"error": {"code": 400, "message": "Invalid field"}})
+            return
+        offset = int(params["resultOffset"])
+        count = int(params["resultRecordCount"])
+        self.send_json(
+            {
+                "features": [
+                    {"attributes": {field: record[field] for field in fields}}
+                    for record in self.records[offset : offset + count]
+                ],
+                "exceededTransferLimit": offset + count < len(self.records),
+            }
+        )
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def layer_url():
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    Handler.queries = []
+    yield "http://127.0.0.1:%i/FeatureServer/0" % server.server_port
+    server.shutdown()
+
+
+def test_query(layer_url):
+    layer = FeatureServer(layer_url)
+    assert layer.case_fields() == ["total04_12_2020", "total04_13_2020"]
+    table = layer.query(["ZIP_CODE", "total04_13_2020"])
+    assert list(table.columns) == ["ZIP_CODE", "total04_13_2020"]
+    assert table.ZIP_CODE.tolist() == [record["ZIP_CODE"] for record in RECORDS]
+    assert table.total04_13_2020.fillna(-1).tolist() == [4, -1, 3, 2, 5]
+
+    # 3 pages of 2 records, only the requested fields, no geometries
+    assert [query["resultOffset"] for query in Handler.queries] == ["0", "2", "4"]
+    for query in Handler.queries:
+        assert query["outFields"] == "ZIP_CODE,total04_13_2020"
+        assert query["returnGeometry"] == "false"
+        assert query["orderByFields"] == "OBJECTID"
+
+
+def test_query_many_fields(layer_url, monkeypatch):
+    # one case field per day for two years, too long for a url
+    dates = pd.date_range("2020-04-12", periods=730)
+    fields = ["total%s" % date.strftime("%m_%d_%Y") for date in dates]
+    records = [
+        dict({"OBJECTID": i + 1, "ZIP_CODE": zip_code}, **dict.fromkeys(fields, i))
+        for i, zip_code in enumerate(["20850", "20851", "20852"])
+    ]
+    monkeypatch.setattr(Handler, "records", records)
+    layer = FeatureServer(layer_url)
+    assert len(layer.url + "?outFields=" + ",".join(fields)) > Handler.MAX_URL
+    assert layer.case_fields() == fields
+    table = layer.query(["ZIP_CODE"] + fields)
+    assert table.shape == (3, 731)
+    assert table[fields[-1]].tolist() == [0, 1, 2]
+
+
+def test_query_errors(layer_url):
+    layer = FeatureServer(layer_url)
+    with pytest.raises(IndexError):
+        layer.query(["ZIP_CODE", "total04_14_2020"])
+    layer.fields = lambda: ["ZIP_CODE", "unknown"]
+    with pytest.raises(COVIDerror):
+        layer.query(["ZIP_CODE", "unknown"])
+
+
+def test_get_dates(layer_url, tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        download, "Data", lambda: SimpleNamespace(MD_zip_layer_url=layer_url)
+    )
+    monkeypatch.setattr(download, "FIRST_DAY", "2020-04-12")
+    (tmp_path / "2020-04-12.tsv").write_text("20850\t3 Cases\n")
+    (tmp_path / "2020-04-13.tsv").write_text("")  # not in the database yet
+    dates = download.missing_dates(str(tmp_path), end="2020-04-14")
+    assert dates == ["2020-04-13", "2020-04-14"]
+    written = download.get_dates(dates, str(tmp_path))
+    assert written == [str(tmp_path / "2020-04-13.tsv")]
+    assert (tmp_path / "2020-04-13.tsv").read_text().splitlines() == [
+        "20850\t4 Cases",
+        "21802\t3 Cases",
+        "21804\t2 Cases",
+        "20852\t5 Cases",
+    ]
+    assert {query["outFields"] for query in Handler.queries} == {
+        "ZIP_CODE,total04_13_2020"
+    }
+
+
+def melt_cases(table):
+    """
+    the old wide to long transform of read_zip_COVID_web
+    """
+    return (
+        table.pipe(lambda d: d[~pd.isnull(d.ZIP_CODE)])
+        .pipe(pd.melt, id_vars=["ZIP_CODE"], var_name="Date", value_name="Cases")
+        .assign(Cases=lambda d: d.Cases.fillna(0))
+        .assign(
+            Date=lambda d: d.Date.str.extract("([0-9]+_[0-9]+_[0-9]+)$", expand=False)
+        )
+        .assign(Date=lambda d: pd.to_datetime(d.Date, format="%m_%d_%Y"))
+        .assign(ZIP_CODE=lambda d: d.ZIP_CODE.where(d.ZIP_CODE != "21802", "21804"))
+        .groupby(["ZIP_CODE", "Date"], as_index=False)
+        .agg({"Cases": "sum"})
+        .assign(ZIP_CODE=lambda d: d.ZIP_CODE.astype(int))
+        .rename(columns={"ZIP_CODE": "Zip"})
+        .pipe(compact_cases)
+    )
+
+
+def test_read_zip_COVID_web(layer_url, tmp_path):
+    data = Data(datadir=str(tmp_path))
+    data.MD_zip_layer_url = layer_url
+    data.read_zip_COVID_web()
+    table = pd.DataFrame(RECORDS).drop(columns="OBJECTID")
+    pd.testing.assert_frame_equal(data.zip_covid, melt_cases(table))
+    assert 21802 not in data.zip_covid.Zip.values
+
+    data.zip_aliases = {}
+    data.read_zip_COVID_web()
+    assert 21802 in data.zip_covid.Zip.values
+
+
+def test_upstream_new_dates(layer_url, tmp_path):
+    assert str(FeatureServer(layer_url).last_edit()) == "2020-04-13 00:00:00+00:00"
+    assert upstream_new_dates(str(tmp_path), layer_url) == ["2020-04-12", "2020-04-13"]
+
+    (tmp_path / "2020-04-12.tsv").write_text("20850\t3 Cases\n")
+    (tmp_path / "2020-04-13.tsv").write_text("")  # not in the database yet
+    assert upstream_new_dates(str(tmp_path), layer_url) == ["2020-04-13"]
+
+    (tmp_path / "2020-04-13.tsv").write_text("20850\t4 Cases\n")
+    assert upstream_new_dates(str(tmp_path), layer_url) == []
+    # only the metadata is read
+    assert Handler.queries == []
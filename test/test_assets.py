@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+import json
+
+import numpy as np
+from bokeh.layouts import column
+from bokeh.models import ColumnDataSource, GeoJSONDataSource
+
+from src.assets import EMPTY_GEOJSON, MS_PER_DAY, externalize, write_lines
+
+XS = [[18364.0, 18365.0, 18366.0], [], [18365.0]]  # days since epoch
+YS = [[3.0, 5.0, 6.5], [], [1.0]]
+
+
+def read_lines(filename):
+    """
+    read the binary layout the same way as loadLines in the page
+    """
+    buffer = open(filename, "rb").read()
+    n = np.frombuffer(buffer, "<i4", 1)[0]
+    offsets = np.frombuffer(buffer, "<i4", n + 1, 4)
+    days = np.frombuffer(buffer, "<i4", offsets[n], 4 * (n + 2))
+    values = np.frombuffer(buffer, "<f4", offsets[n], 4 * (n + 2 + offsets[n]))
+    assert len(buffer) == 4 * (n + 2 + 2 * offsets[n])
+    xs = [
+        days[start:end] * float(MS_PER_DAY) for start, end in zip(offsets, offsets[1:])
+    ]
+    ys = [values[start:end] for start, end in zip(offsets, offsets[1:])]
+    return xs, ys
+
+
+def lines_source():
+    return ColumnDataSource(
+        {
+            "Zip": ["20850", "20851", "20852"],
+            "xs": [np.array(x) * MS_PER_DAY for x in XS],
+            "ys": [np.array(y) for y in YS],
+        },
+        name="Zip_Cases",
+    )
+
+
+def test_write_lines(tmp_path):
+    write_lines(lines_source(), str(tmp_path / "lines.bin"))
+    xs, ys = read_lines(str(tmp_path / "lines.bin"))
+    assert [x.tolist() for x in xs] == [[x * MS_PER_DAY for x in line] for line in XS]
+    assert [y.tolist() for y in ys] == YS
+
+
+def test_externalize(tmp_path):
+    geojson = '{"type": "FeatureCollection", "features": [{"id": "0"}]}'
+    dashboard = column(
+        [],
+        tags=[
+            lines_source(),
+            GeoJSONDataSource(geojson=geojson, name="Zip_map"),
+            ColumnDataSource({"xs": [[1.0]], "ys": [[1.0]]}),  # no name: kept inline
+        ],
+    )
+    template = externalize(dashboard, str(tmp_path), url="https://example.com/data/")
+    lines, geo, inline = dashboard.tags
+
+    assert lines.data["xs"] == [[], [], []]
+    assert lines.data["Zip"] == ["20850", "20851", "20852"]
+    assert read_lines(str(tmp_path / "Zip_Cases.bin"))[1][0].tolist() == YS[0]
+    assert geo.geojson == EMPTY_GEOJSON
+    assert (tmp_path / "Zip_map.geojson").read_text() == geojson
+    assert inline.data["xs"] == [[1.0]]
+
+    assets = json.loads(template.split("var assets = {% raw %}")[1].split("{%")[0])
+    assert assets == {
+        "Zip_Cases": {"url": "https://example.com/data/Zip_Cases.bin", "kind": "lines"},
+        "Zip_map": {
+            "url": "https://example.com/data/Zip_map.geojson",
+            "kind": "geojson",
+        },
+    }
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+
+import json
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from src.utils import COVIDerror, Data, get_data
+
+CASES = {
+    "2020-04-12": {20850: 3, 20851: 1},
+    "2020-04-13": {20850: 5, 20851: 2, 20852: 1},
+    "2020-04-14": {20850: 6, 20852: 2},
+    "2020-04-15": {20850: 8, 20851: 4, 20852: 3},
+}
+
+
+def slow_read(name, seconds=0.3, error=None, value=None):
+    """
+    stand-in for a Data.read_* method waiting on I/O
+    """
+
+    def read(self):
+        time.sleep(seconds)
+        if error:
+            raise error
+        setattr(self, name, name if value is None else value)
+
+    return read
+
+
+@pytest.fixture
+def slow_data(tmp_path, monkeypatch):
+    monkeypatch.setattr(Data, "read_zip_COVID", slow_read("zip_covid"))
+    monkeypatch.setattr(
+        Data, "read_zip_map", slow_read("zip_map", value=pd.DataFrame({"Zip": [1]}))
+    )
+    monkeypatch.setattr(Data, "read_map", slow_read("geo"))
+    monkeypatch.setattr(Data, "read_population", slow_read("zip_population"))
+    return Data(datadir=str(tmp_path))
+
+
+def test_get_parallel(slow_data):
+    start = time.perf_counter()
+    slow_data.get(parallel=True)
+    # zip map and then the shapes is the slowest chain (0.6 s), not the sum (1.2 s)
+    assert time.perf_counter() - start < 1.0
+    assert slow_data.zip_covid == "zip_covid"
+    assert slow_data.geo == "geo"
+    assert slow_data.zip_population == "zip_population"
+
+
+def test_get_parallel_errors(slow_data, monkeypatch):
+    # the population fails first, but the error of the cases is raised
+    monkeypatch.setattr(
+        Data, "read_zip_COVID", slow_read("zip_covid", 0.3, COVIDerror("cases"))
+    )
+    monkeypatch.setattr(
+        Data, "read_population", slow_read("zip_population", 0, ValueError("pop"))
+    )
+    with pytest.raises(COVIDerror, match="cases"):
+        slow_data.get(parallel=True)
+
+
+@pytest.fixture
+def offline_data(tmp_path, monkeypatch):
+    """
+    daily tsv files of CASES, with stand-ins for the reference data
+    """
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    zips = [20850, 20851, 20852]
+    zip_map = pd.DataFrame({"Zip": zips, "City": ["Rockville"] * 3, "State": "MD"})
+    population = pd.DataFrame({"Zip": [str(z) for z in zips], "Population": 1000})
+    geo = gpd.GeoDataFrame(
+        {"Zip": zips},
+        geometry=[box(-77 + i * 0.1, 39, -76.95 + i * 0.1, 39.05) for i in range(3)],
+        crs="EPSG:4269",
+    )
+    monkeypatch.setattr(
+        Data, "read_zip_map", lambda self: setattr(self, "zip_map", zip_map)
+    )
+    monkeypatch.setattr(
+        Data,
+        "read_population",
+        lambda self: setattr(self, "zip_population", population),
+    )
+    monkeypatch.setattr(Data, "read_map", lambda self: setattr(self, "geo", geo))
+
+    datadir = tmp_path / "data"
+    datadir.mkdir()
+
+    def write_day(date):
+        (datadir / ("%s.tsv" % date)).write_text(
+            "".join("%i\t%i Cases\n" % item for item in CASES[date].items())
+        )
+
+    return datadir, write_day
+
+
+def build(datadir, outdir, **kwargs):
+    outdir.mkdir(exist_ok=True)
+    return get_data(
+        ts_data_file=str(outdir / "ts.csv"),
+        map_data_file=str(outdir / "MD.geojson"),
+        datadir=str(datadir),
+        manifest_file=str(outdir / "derived.json"),
+        parallel=False,
+        **kwargs
+    )[0]
+
+
+def test_get_data_manifest(offline_data, tmp_path):
+    from src.manifest import Manifest, tsv_checksums
+
+    datadir, write_day = offline_data
+    for date in ["2020-04-12", "2020-04-14"]:
+        write_day(date)
+    build(datadir, tmp_path / "out")
+    outputs = {
+        "ts": str(tmp_path / "out/ts.csv"),
+        "map": str(tmp_path / "out/MD.geojson"),
+    }
+    manifest = Manifest(str(tmp_path / "out/derived.json"))
+    assert manifest.is_current(tsv_checksums(str(datadir)), outputs)
+
+    # a backfilled day changes the forward filled cases of the days after it
+    write_day("2020-04-13")
+    manifest = Manifest(str(tmp_path / "out/derived.json"))
+    assert not manifest.is_current(tsv_checksums(str(datadir)), outputs)
+    ts_data = build(datadir, tmp_path / "out")
+    cases = ts_data.set_index(["Zip", "Date"]).Cases
+    assert cases[(20851, pd.Timestamp("2020-04-14"))] == 2
+
+    manifest = json.loads((tmp_path / "out/derived.json").read_text())
+    assert sorted(manifest["dates"]) == ["2020-04-12", "2020-04-13", "2020-04-14"]
+    assert sorted(manifest["checksums"]) == ["map", "ts"]
+
+
+def test_read_map_cache(tmp_path):
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    gpd.GeoDataFrame(
+        {"ZCTA5CE10": ["20850", "20851", "10001"]},
+        geometry=[box(-77.2, 39.0, -77.1, 39.1), box(-77.1, 39.0, -77.0, 39.1)]
+        + [box(-74.0, 40.7, -73.9, 40.8)],  # outside of MD
+        crs="EPSG:4269",
+    ).to_file(str(tmp_path / "tl_2019_us_zcta510.shp"))
+
+    data = Data(datadir=str(tmp_path))
+    data.zip_map = pd.DataFrame({"Zip": [20850]})
+    data.read_map()
+    assert data.geo.Zip.tolist() == [20850]
+    (cache_file,) = tmp_path.glob("*.gpkg")
+    assert len(gpd.read_file(cache_file)) == 2  # all the shapes in the MD bbox
+
+    # a zip code added to the map has its shape, from the same cache
+    data.zip_map = pd.DataFrame({"Zip": [20850, 20851]})
+    data.read_map()
+    assert data.geo.Zip.tolist() == [20850, 20851]
+    assert list(tmp_path.glob("*.gpkg")) == [cache_file]
+
+    # a new shapefile replaces the cache of the old one
+    stat = os.stat(str(tmp_path / "tl_2019_us_zcta510.shp"))
+    os.utime(
+        str(tmp_path / "tl_2019_us_zcta510.shp"),
+        ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9),
+    )
+    data.read_map()
+    (new_cache_file,) = tmp_path.glob("*.gpkg")
+    assert new_cache_file != cache_file
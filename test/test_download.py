@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+import io
+
+import pandas as pd
+import pytest
+
+from src import download
+
+DB = pd.DataFrame(
+    {
+        "ZIP_CODE": ["20850", "20851", "20852"],
+        "total04_12_2020": [3, None, 0],
+        "total04_13_2020": [4.0, 1.0, 2.0],
+    }
+)
+
+
+def test_date_range():
+    assert download.date_range("2020-12-30", "2021-01-02") == [
+        "2020-12-30",
+        "2020-12-31",
+        "2021-01-01",
+        "2021-01-02",
+    ]
+    assert download.date_range("2020-04-12", "2020-04-12") == ["2020-04-12"]
+    assert download.date_range("2020-04-13", "2020-04-12") == []
+    with pytest.raises(ValueError):
+        download.date_range("04/12/2020", "2020-04-13")
+
+
+def test_write_day():
+    out = io.StringIO()
+    download.write_day(DB, "2020-04-12", out)
+    # no cases or zero cases are not written
+    assert out.getvalue() == "20850\t3 Cases\n"
+
+    with pytest.raises(IndexError):
+        download.write_day(DB, "2020-04-14", io.StringIO())
+
+
+def test_get_dates(tmp_path, monkeypatch):
+    requested = []
+
+    def read_database(dates):
+        requested.append(dates)
+        return DB
+
+    monkeypatch.setattr(download, "read_database", read_database)
+    dates = ["2020-04-12", "2020-04-13", "2020-04-14"]
+    written = download.get_dates(dates, str(tmp_path))
+    # one download for all the dates, and no file for a date not in the database
+    assert requested == [dates]
+    assert written == [
+        str(tmp_path / "2020-04-12.tsv"),
+        str(tmp_path / "2020-04-13.tsv"),
+    ]
+    assert (tmp_path / "2020-04-13.tsv").read_text().splitlines() == [
+        "20850\t4 Cases",
+        "20851\t1 Cases",
+        "20852\t2 Cases",
+    ]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "2020-04-12.tsv",
+        "2020-04-13.tsv",
+    ]
+
+    assert download.get_dates([], str(tmp_path)) == []
+    assert len(requested) == 1
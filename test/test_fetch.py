@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+
+import hashlib
+import io
+import os
+import threading
+import zipfile
+from enum import Enum
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from src.fetch import FetchCache, download_file, extract_members, verify_zip
+from src.utils import COVIDerror, Data
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    serves /data with an ETag, and counts the requests
+    """
+
+    body = b"Zip Code;Official USPS city name\n20850;Rockville\n"
+    etag = '"v1"'
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+def shapefile_zip():
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as z:
+        for suffix in [".shp", ".shx", ".dbf", ".prj", ".cpg", ".shp.iso.xml"]:
+            z.writestr("tl_2019_us_zcta510" + suffix, suffix * 1000)
+    return archive.getvalue()
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """
+    serves a zip file with an ETag, from the offset of a Range header if If-Range
+    matches the ETag, and drops the connection after the first truncate bytes
+    """
+
+    body = shapefile_zip()
+    etag = '"v1"'
+    truncate = None
+    requests = []
+
+    def do_GET(self):
+        byte_range = self.headers.get("Range")
+        self.requests.append((byte_range, self.headers.get("If-Range")))
+        offset = 0
+        if byte_range and self.headers.get("If-Range") == self.etag:
+            offset = int(byte_range[len("bytes=") : -1])
+        if offset >= len(self.body):
+            self.send_response(416)
+            self.end_headers()
+            return
+        self.send_response(206 if offset else 200)
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(self.body) - offset))
+        self.end_headers()
+        self.wfile.write(self.body[offset:][: self.truncate])
+        type(self).truncate = None
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def zip_url():
+    server = HTTPServer(("127.0.0.1", 0), RangeHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    RangeHandler.requests = []
+    yield "http://127.0.0.1:%i/tl_2019_us_zcta510.zip" % server.server_port
+    server.shutdown()
+
+
+@pytest.fixture
+def urls():
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    Handler.requests = []
+    yield Enum("Urls", {"zip_to_city": "http://127.0.0.1:%i/data" % server.server_port})
+    server.shutdown()
+
+
+def test_fetch_cache(tmp_path, urls):
+    cache = FetchCache(str(tmp_path), ttl=3600)
+    cache_file = cache.fetch(urls.zip_to_city)
+    assert open(cache_file, "rb").read() == Handler.body
+    assert Handler.requests == [None]
+
+    # within the TTL: no request
+    cache.fetch(urls.zip_to_city)
+    assert Handler.requests == [None]
+
+    # expired: revalidated with the ETag
+    assert cache.fetch(urls.zip_to_city, ttl=0) == cache_file
+    assert Handler.requests == [None, '"v1"']
+    assert open(cache_file, "rb").read() == Handler.body
+
+
+def test_fetch_fixture(tmp_path, urls):
+    fixture_dir = tmp_path / "fixtures"
+    fixture_dir.mkdir()
+    cache = FetchCache(str(tmp_path / "cache"), fixture_dir=str(fixture_dir))
+    with pytest.raises(COVIDerror):
+        cache.fetch(urls.zip_to_city)
+
+    (fixture_dir / "zip_to_city").write_text("offline")
+    assert open(cache.fetch(urls.zip_to_city)).read() == "offline"
+    assert Handler.requests == []
+
+
+def test_fetch_evict(tmp_path, urls):
+    cache = FetchCache(str(tmp_path), max_bytes=1)
+    (tmp_path / "old_entry").write_text("x" * 100)
+    cache_file = cache.fetch(urls.zip_to_city)
+    assert not (tmp_path / "old_entry").exists()
+    assert open(cache_file, "rb").read() == Handler.body
+
+
+def test_fetch_evict_threads(tmp_path, urls, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    # entries removed by another process after being listed are skipped
+    listdir = os.listdir
+    monkeypatch.setattr(os, "listdir", lambda path: listdir(path) + ["vanished"])
+
+    sources = Enum(
+        "Urls", {"data%i" % i: urls.zip_to_city.value + str(i) for i in range(8)}
+    )
+    cache = FetchCache(str(tmp_path), ttl=0, max_bytes=len(Handler.body) * 2)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        for _ in range(5):
+            list(pool.map(cache.fetch, sources))
+    assert 1 <= len(listdir(str(tmp_path))) <= 2 * 2  # entries and their .json
+
+
+def test_download_file(tmp_path, zip_url, monkeypatch):
+    body = RangeHandler.body
+    sha1 = hashlib.sha1(body).hexdigest()
+    filename = str(tmp_path / "shapes.zip")
+    assert download_file(zip_url, filename, sha1=sha1, chunk_size=100) == filename
+    assert open(filename, "rb").read() == body
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["shapes.zip"]
+
+    # interrupted, and resumed from the partial file
+    RangeHandler.truncate = 1000
+    filename = str(tmp_path / "resumed.zip")
+    with pytest.raises(COVIDerror):
+        download_file(zip_url, filename, sha1=sha1, chunk_size=100)
+    assert (tmp_path / "resumed.zip.part").read_bytes() == body[:1000]
+    download_file(zip_url, filename, sha1=sha1)
+    assert (tmp_path / "resumed.zip").read_bytes() == body
+    assert RangeHandler.requests[-1] == ("bytes=1000-", '"v1"')
+    assert not (tmp_path / "resumed.zip.part.json").exists()
+
+    # the file changed after the interruption: not spliced, downloaded again
+    RangeHandler.truncate = 1000
+    filename = str(tmp_path / "changed.zip")
+    with pytest.raises(COVIDerror):
+        download_file(zip_url, filename, chunk_size=100)
+    monkeypatch.setattr(RangeHandler, "body", body[::-1])
+    monkeypatch.setattr(RangeHandler, "etag", '"v2"')
+    download_file(zip_url, filename)
+    assert (tmp_path / "changed.zip").read_bytes() == body[::-1]
+    assert RangeHandler.requests[-1] == ("bytes=1000-", '"v1"')
+
+    # a partial file of unknown origin is not resumed
+    (tmp_path / "unknown.zip.part").write_bytes(b"x" * 1000)
+    download_file(zip_url, str(tmp_path / "unknown.zip"))
+    assert (tmp_path / "unknown.zip").read_bytes() == body[::-1]
+    assert RangeHandler.requests[-1] == (None, None)
+
+    with pytest.raises(COVIDerror):
+        download_file(zip_url, str(tmp_path / "corrupted.zip"), sha1=sha1)
+    assert not (tmp_path / "corrupted.zip").exists()
+    assert not (tmp_path / "corrupted.zip.part").exists()
+
+    # the reversed body is not a zip file
+    with pytest.raises(COVIDerror):
+        download_file(zip_url, str(tmp_path / "bad.zip"), verify=verify_zip)
+    assert not (tmp_path / "bad.zip").exists()
+    assert not (tmp_path / "bad.zip.part").exists()
+
+
+def test_verify_zip(tmp_path):
+    body = RangeHandler.body
+    zip_file = tmp_path / "shapes.zip"
+    zip_file.write_bytes(body)
+    verify_zip(str(zip_file))
+
+    # a flipped byte in the data of the first member
+    offset = body.index(b".shp" * 10)
+    zip_file.write_bytes(body[:offset] + b"x" + body[offset + 1 :])
+    with pytest.raises(COVIDerror, match="bad CRC"):
+        verify_zip(str(zip_file))
+
+
+def test_extract_members(tmp_path, zip_url):
+    zip_file = tmp_path / "shapes.zip"
+    zip_file.write_bytes(RangeHandler.body)
+    extracted = extract_members(str(zip_file), str(tmp_path))
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "shapes.zip",
+        "tl_2019_us_zcta510.dbf",
+        "tl_2019_us_zcta510.prj",
+        "tl_2019_us_zcta510.shp",
+        "tl_2019_us_zcta510.shx",
+    ]
+    assert len(extracted) == 4
+    assert (tmp_path / "tl_2019_us_zcta510.prj").read_text() == ".prj" * 1000
+
+    zip_file.write_bytes(b"not a zip file")
+    with pytest.raises(COVIDerror):
+        extract_members(str(zip_file), str(tmp_path))
+    assert not zip_file.exists()
+
+    # Data downloads the zip file and extracts the shapefile
+    (tmp_path / "data").mkdir()
+    data = Data(datadir=str(tmp_path / "data"))
+    data.geo_shape_url = zip_url
+    data.download_zipfile(str(tmp_path / "data" / "tl_2019_us_zcta510.zip"))
+    assert (tmp_path / "data" / "tl_2019_us_zcta510.shp").read_text() == ".shp" * 1000
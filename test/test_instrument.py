@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+import json
+
+from src.instrument import RunReport, report, timed
+
+
+@timed
+def count_rows(rows):
+    report.count(rows)
+    return rows
+
+
+def test_run_report(tmp_path):
+    report.reset()
+    with report.stage("outer"):
+        assert count_rows(3) == 3
+    count_rows(5)
+
+    report_file = str(tmp_path / "report.json")
+    report.save(report_file)
+    saved = json.load(open(report_file))
+    assert [r["stage"] for r in saved["stages"]] == [
+        "outer",
+        "outer/count_rows",
+        "count_rows",
+    ]
+    assert [r.get("rows") for r in saved["stages"]] == [None, 3, 5]
+    for r in saved["stages"]:
+        assert r["wall_s"] >= 0 and r["cpu_s"] >= 0 and r["peak_rss_mib"] > 0
+    assert saved["wall_s"] >= saved["stages"][0]["wall_s"]
+
+
+def test_count_outside_stage():
+    run = RunReport()
+    run.count(1)
+    assert run.stages == []
+
+
+def test_stages_in_threads():
+    from concurrent.futures import ThreadPoolExecutor
+
+    report.reset()
+    with report.stage("outer"):
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            inside = pool.submit(report.within, report.current(), count_rows, 3)
+            outside = pool.submit(count_rows, 5)
+        assert inside.result() == 3 and outside.result() == 5
+        assert report.current()["stage"] == "outer"
+    assert report.current() is None
+    rows = {r["stage"]: r.get("rows") for r in report.stages}
+    assert rows == {"outer": None, "outer/count_rows": 3, "count_rows": 5}
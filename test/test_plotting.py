@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+
+import pandas as pd
+from bokeh.models import HoverTool
+
+from src.plotting import TSplot
+
+
+def test_ts_plot_highlight():
+    ts_data = pd.DataFrame(
+        {
+            "Zip": [20850, 20850, 20851, 20851, 20852, 20852],
+            "City": ["Rockville", "Rockville", "Rockville"] * 2,
+            "Date": pd.to_datetime(["2020-04-12", "2020-04-13"] * 3),
+            "Cases": [3, 5, 1, 2, 4, 4],
+        }
+    )
+    tsp = TSplot(ts_data, y="Cases", tooltips=[("Cases", "$data_y{0}")])
+    tsp.plot("Zip", highlight=20850)
+
+    assert tsp.index == {"20850": 0, "20851": 1, "20852": 2}
+    assert tsp.source.data["ys"][2].tolist() == [4, 4]
+
+    # only the highlighted line, drawn over the other lines
+    assert tsp.highlight_source.data["Zip"] == ["20850"]
+    assert tsp.highlight_source.data["ys"][0].tolist() == [3, 5]
+    assert tsp.highlight.level == "overlay"
+
+    # the hover shows the data values of the nearest point of the lines
+    (hover,) = tsp.p.select(type=HoverTool)
+    assert hover.renderers == [tsp.lines]
+    assert hover.line_policy == "nearest"
+    assert ("Zip code", "@Zip") in hover.tooltips
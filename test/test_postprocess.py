@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+
+import gzip
+
+import pytest
+
+from src import postprocess
+from src.postprocess import strip_doctype
+
+HTML = "<!DOCTYPE html>\n<html lang='en'>\n  <head>  \n\n\t<script>\n    var x = 1;  \n  </script>\n</head>\n</html>\n"
+
+
+def line_by_line(html):
+    """
+    the old markdown_html
+    """
+    return "".join(
+        line.strip() + "\n"
+        for line in html.splitlines()
+        if "<!DOCTYPE html>" not in line.strip()
+    )
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1 << 20])
+@pytest.mark.parametrize("html", [HTML, HTML.rstrip() + "  "])
+def test_strip_doctype(tmp_path, monkeypatch, chunk_size, html):
+    monkeypatch.setattr(postprocess, "CHUNK_SIZE", chunk_size)
+    html_file = tmp_path / "in.html"
+    html_file.write_text(html)
+    out_file = str(tmp_path / "out.html")
+    strip_doctype(str(html_file), out_file, compress=("gzip",))
+    assert open(out_file).read() == line_by_line(html)
+    assert gzip.open(out_file + ".gz").read().decode() == line_by_line(html)
+
+
+def test_strip_doctype_keep_lines(tmp_path):
+    html_file = tmp_path / "in.html"
+    html_file.write_text(HTML)
+    out_file = str(tmp_path / "out.html")
+    strip_doctype(str(html_file), out_file, strip_lines=False)
+    assert open(out_file).read() == HTML.replace("<!DOCTYPE html>\n", "")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+import glob
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from src.store import CaseStore
+from src.utils import FIRST_DAY, compact_cases
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__)) + "/../data"
+
+
+def read_tsv_files(data_dir):
+    """
+    the old per-file concatenation
+    """
+    data_files = sorted(glob.glob(data_dir + "/*.tsv"))
+    return (
+        pd.concat(
+            pd.read_csv(
+                tsv,
+                names=["Zip", "Cases"],
+                sep="\t",
+                dtype={"Zip": "Int64", "Cases": "str"},
+            )
+            .assign(Cases=lambda d: d.Cases.str.replace(" Cases", "").astype(int))
+            .assign(Date=os.path.basename(tsv).replace(".tsv", ""))
+            for tsv in data_files
+        )
+        .assign(Date=lambda d: pd.to_datetime(d.Date, format="%Y-%m-%d"))
+        .sort_values(["Date", "Zip"])
+        .reset_index(drop=True)
+    )
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    for tsv in sorted(glob.glob(DATA_DIR + "/*.tsv"))[:5]:
+        shutil.copy(tsv, tmp_path)
+    return str(tmp_path)
+
+
+def test_store_matches_tsv(data_dir):
+    store = CaseStore(data_dir)
+    assert store.update() == 5
+    pd.testing.assert_frame_equal(store.to_frame(), read_tsv_files(data_dir))
+
+
+def test_store_incremental(data_dir):
+    CaseStore(data_dir).update()
+    shutil.copy(sorted(glob.glob(DATA_DIR + "/*.tsv"))[5], data_dir)
+
+    store = CaseStore(data_dir)
+    assert store.update() == 1
+    assert store.update() == 0
+    pd.testing.assert_frame_equal(store.to_frame(), read_tsv_files(data_dir))
+
+    os.remove(sorted(glob.glob(data_dir + "/*.tsv"))[0])
+    store = CaseStore(data_dir)
+    assert store.update() == 0
+    assert store.dates.size == 5
+    pd.testing.assert_frame_equal(store.to_frame(), read_tsv_files(data_dir))
+
+
+def test_compact_cases(data_dir):
+    store = CaseStore(data_dir)
+    store.update()
+    cases = store.to_frame()
+    compact = compact_cases(cases)
+    assert compact.dtypes.Zip == "uint32" and compact.dtypes.Cases == "int32"
+    assert (
+        compact.Date.cat.codes == (cases.Date - pd.Timestamp(FIRST_DAY)).dt.days
+    ).all()
+    assert compact.Date.cat.categories[0] == pd.Timestamp(FIRST_DAY)
+    assert compact.Date.max() == cases.Date.max()
+    pd.testing.assert_frame_equal(
+        compact.astype({"Zip": "Int64", "Cases": int, "Date": "datetime64[ns]"}), cases
+    )
+    assert compact.memory_usage(deep=True).sum() < cases.memory_usage(deep=True).sum()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.timeseries import CaseMatrix, time_series
+
+
+@pytest.fixture
+def zip_covid():
+    # 20851 is not reported on the second day, 20852 only shows up on the last day
+    return pd.DataFrame(
+        {
+            "Zip": [20850, 20851, 20850, 20850, 20851, 20852],
+            "Date": pd.to_datetime(
+                [
+                    "2020-04-12",
+                    "2020-04-12",
+                    "2020-04-13",
+                    "2020-04-14",
+                    "2020-04-14",
+                    "2020-04-14",
+                ]
+            ),
+            "Cases": [1, 5, 3, 2, 9, 4],
+        }
+    )
+
+
+def test_daily_increase(zip_covid):
+    matrix = CaseMatrix.from_frame(zip_covid)
+    np.testing.assert_array_equal(matrix.zips, [20850, 20851, 20852])
+    np.testing.assert_array_equal(
+        matrix.daily_increase(),
+        [[np.nan, 2, -1], [np.nan, 0, 4], [np.nan, np.nan, np.nan]],
+    )
+    np.testing.assert_array_equal(
+        matrix.rolling_increase(window=2),
+        [[0, 2, 1], [0, 0, 4], [np.nan, np.nan, 0]],
+    )
+
+
+def test_latest_increase(zip_covid):
+    # the per zip code nlargest(2, "Date") calculation
+    expected = (
+        zip_covid.groupby("Zip", as_index=False)
+        .apply(
+            lambda d: d.nlargest(2, "Date")
+            .assign(increase=lambda d: d.Cases.max() - d.Cases.min())
+            .pipe(lambda d: d[d.Date == d.Date.max()])
+        )
+        .filter(["Zip", "increase"])
+        .astype(float)
+        .reset_index(drop=True)
+    )
+    increase = CaseMatrix.from_frame(zip_covid).latest_increase()
+    pd.testing.assert_frame_equal(increase.astype(float), expected)
+
+
+def test_time_series(zip_covid):
+    zip_map = pd.DataFrame({"Zip": [20850, 20851, 20852], "City": ["A", "B", "B"]})
+    ts_data = time_series(zip_covid, zip_map)
+    assert ts_data.columns.tolist() == [
+        "Zip",
+        "Cases",
+        "Date",
+        "City",
+        "formatted_date",
+    ]
+    assert ts_data.Zip.tolist() == [20850] * 3 + [20851] * 3 + [20852]
+    assert ts_data.Cases.tolist() == [1, 3, 2, 5, 5, 9, 4]
+    assert ts_data.formatted_date.tolist()[:3] == [
+        "2020-04-12",
+        "2020-04-13",
+        "2020-04-14",
+    ]
+
+
+def test_from_wide():
+    dates = np.array(["2020-04-13", "2020-04-12"], dtype="datetime64[ns]")
+    cases = np.array([[2.0, 1.0], [5.0, 4.0], [1.0, 0.0]])
+    matrix = CaseMatrix.from_wide(
+        np.array([21802, 20850, 21804]), dates, cases, zip_aliases={21802: 21804}
+    )
+    np.testing.assert_array_equal(matrix.zips, [20850, 21804])
+    np.testing.assert_array_equal(matrix.dates, np.sort(dates))
+    np.testing.assert_array_equal(matrix.cases, [[4.0, 5.0], [1.0, 3.0]])
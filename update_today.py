@@ -1,15 +1,24 @@
+import argparse
+import glob
 import logging
 import os
 import shlex
 import subprocess
-from datetime import date, timedelta
+import sys
+from datetime import date
 from pathlib import Path
 
 import luigi
-from git import Repo
+from git import GitCommandError, Repo
 from luigi.local_target import LocalTarget
 from luigi.mock import MockTarget
 
+from src.check import upstream_new_dates
+from src.download import get_dates, missing_dates
+from src.manifest import Manifest
+from src.postprocess import strip_doctype
+from src.utils import COVIDerror, file_checksum
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s || %(levelname)s  || %(name)s || %(message)s",
@@ -20,29 +29,24 @@ logger = logging.getLogger("Update")
 FILE = Path(__file__).absolute()
 WORKING_DIR = FILE.parent
 WEB_DIR = WORKING_DIR.parent / "wckdouglas.github.io"
-FIRST_DAY = date(2020, 4, 12)
 TODAY = date.today()
+INGESTED_FILE = str(WORKING_DIR / "data/ingested.json")  # date -> sha1 of committed tsv
 
 
 class GetData(luigi.Task):
     """
-    For a given date (e.g. "2021-05-01"), retrieve data and save it to data/
+    Retrieve the days without a tsv file in data/ (e.g. "2021-05-01") with one
+    download of only their columns, and save them to data/
     """
 
-    day = luigi.Parameter()
-    force = luigi.BoolParameter(default=False)
-
-    def rquires(self):
-        return [CovidPull(force=self.force)]
-
     def output(self):
-        return luigi.LocalTarget(WORKING_DIR / "data/{}.tsv".format(self.day))
+        return MockTarget("get_data", mirror_on_stderr=True)
 
-    def run(self):  # work if SGE
-        cmd = "python dashboard.py get --date {}".format(self.day)
-        logger.debug("Getting {}".format(self.output().path))
+    def run(self):
+        datadir = str(WORKING_DIR / "data")
+        written = get_dates(missing_dates(datadir, end=str(TODAY)), datadir)
         with self.output().open("w") as out:
-            subprocess.run(shlex.split(cmd), stdout=out)
+            print("got {} days".format(len(written)), file=out)
 
 
 class CovidPull(luigi.Task):
@@ -67,8 +71,10 @@ class CovidPull(luigi.Task):
 
 class SyncRepo(luigi.Task):
     """
-    2. git add the newly added file in data/
-    3. git push
+    1. get the days without data (GetData)
+    2. git add the files in data/ that are not in the manifest of ingested days
+       (data/ingested.json) or differ from their sha1 in it, in one batch
+    3. git commit, if anything is changed, and push if the branch is ahead of origin
     """
 
     force = luigi.BoolParameter(default=False)
@@ -80,21 +86,43 @@ class SyncRepo(luigi.Task):
         return luigi.LocalTarget(self.output_file)
 
     def requires(self):
-        return [
-            GetData(day=str(day), force=self.force)
-            for day in date_range(FIRST_DAY, TODAY)
-        ]
+        return [GetData()]
 
     def run(self):
+        manifest = Manifest(INGESTED_FILE)
+        tsv_files = {
+            os.path.basename(tsv)[: -len(".tsv")]: tsv
+            for tsv in glob.glob(str(WORKING_DIR / "data/*.tsv"))
+            if os.path.getsize(tsv) > 0  # empty: not in the database
+        }
+        checksums = {day: file_checksum(tsv) for day, tsv in tsv_files.items()}
+        # new days, and days changed since they were ingested (e.g. fetched again)
+        days = manifest.new_dates(checksums) + [
+            day for day in manifest.changed_dates(checksums) if day in checksums
+        ]
 
         with Repo(WORKING_DIR) as repo:
-            index = repo.index
-            for task in self.requires():
-                if os.stat(task.output().path).st_size > 0:
-                    index.add(task.output().path)
-                    logger.info("Added {}".format(task.output().path))
-            index.commit("Added %s" % task.output().path)
-        git_sync(WORKING_DIR, action="push")
+            paths = [
+                os.path.relpath(tsv_files[day], repo.working_tree_dir)
+                for day in sorted(days)
+            ]
+            added = []
+            if paths:
+                repo.index.add(paths)
+                # only the files staged here, not whatever else is in the index
+                added = sorted(d.a_path for d in repo.index.diff("HEAD", paths=paths))
+            if added:
+                # "git commit -- <paths>" leaves the rest of the index out
+                repo.git.commit("-m", "Added %s" % ", ".join(added), "--", *added)
+                logger.info("Committed {}".format(", ".join(added)))
+            else:
+                logger.info("No new data to commit")
+            manifest.dates.update({day: checksums[day] for day in days})
+            manifest.save()
+            ahead = is_ahead(repo)
+        # also pushes the commits of an earlier run whose push failed
+        if ahead:
+            git_sync(WORKING_DIR, action="push")
 
         with open(self.output().path, "w") as out:
             print("git_push", file=out)
@@ -102,7 +130,7 @@ class SyncRepo(luigi.Task):
 
 class UpdateDashboard(luigi.Task):
     """
-    refresh the dash board
+    refresh the dash board, with a run report of the stages in data/reports/
 
     :param force (bool): remove the existing dashboard.html and rerun this step
     """
@@ -120,9 +148,14 @@ class UpdateDashboard(luigi.Task):
 
     def run(self):
         logger.info("run here")
-        update_cmd = f"poetry run python dashboard.py update -o {self.output().path} --datadir data"
+        report_file = WORKING_DIR / "data/reports/{}.json".format(TODAY)
+        update_cmd = f"poetry run python dashboard.py update -o {self.output().path} --datadir data --report {report_file}"
         logger.info(f"Running: {update_cmd}")
         subprocess.call(shlex.split(update_cmd))
+        if os.path.isfile(report_file):
+            # stage timings of the run, shown in the luigi scheduler
+            with open(report_file) as report:
+                self.set_status_message(report.read())
 
 
 class WebSitePull(luigi.Task):
@@ -145,9 +178,11 @@ class UpdateWebSite(luigi.Task):
     copy the newly made dashboard.html to website repo
 
     :param force (bool): remove the dashboard html file from website repo for rerunning
+    :param compress (bool): also write gzip compressed COVID.html.gz
     """
 
     force = luigi.BoolParameter(default=False)
+    compress = luigi.BoolParameter(default=False)
     output_file = WEB_DIR / "_includes/COVID.html"
     if force and os.path.isfile(output_file):
         os.remove(output_file)
@@ -159,43 +194,59 @@ class UpdateWebSite(luigi.Task):
         return luigi.LocalTarget(self.output_file)
 
     def run(self):
-        with self.output().open("w") as outfile:
-            with UpdateDashboard().output().open("r") as infile:
-                for line in infile:
-                    print(line.strip().replace("<!DOCTYPE html>", ""), file=outfile)
+        strip_doctype(
+            UpdateDashboard().output().path,
+            self.output().path,
+            compress=("gzip",) if self.compress else (),
+        )
 
 
 class PushWebSite(luigi.Task):
+    """
+    commit and push the website repo
+
+    :param compress (bool): also write and publish gzip compressed COVID.html.gz
+    """
+
     force = luigi.BoolParameter(default=False)
+    compress = luigi.BoolParameter(default=False)
     output_file = WEB_DIR / "git_push"
     if force and os.path.isfile(output_file):
         os.remove(output_file)
 
     def requires(self):
-        return [UpdateWebSite(force=self.force)]
+        return [UpdateWebSite(force=self.force, compress=self.compress)]
 
     def output(self):
         return luigi.LocalTarget(self.output_file)
 
     def run(self):
         os.chdir(WEB_DIR)
+        html_file = self.requires()[0].output().path
+        published = [html_file, html_file + ".gz"] if self.compress else [html_file]
         with Repo(WEB_DIR) as web_repo:
-            web_repo.index.add(self.requires()[0].output().path)
+            web_repo.index.add(published)
             web_repo.index.commit("Updated {}".format(TODAY))
         git_sync(WEB_DIR, action="push")
         with self.output().open("w") as out:
             print("pushed website", file=out)
 
 
-def date_range(date1, date2):
+def is_ahead(repo):
     """
-    copy from https://www.w3resource.com/python-exercises/date-time-exercise/python-date-time-exercise-50.php
+    does the current branch have commits that are not in origin?
 
-    :param date1 (datetime.date): first starting date of the range
-    :param date2 (datetime.date): ending date of the range
+    :param repo (git.Repo): a git repository
+    :return: True if there are commits to push (or origin has no such branch yet)
     """
-    for n in range(int((date2 - date1).days) + 1):
-        yield date1 + timedelta(n)
+    if "origin" not in [remote.name for remote in repo.remotes]:
+        return False
+    branch = repo.active_branch
+    upstream = branch.tracking_branch() or "origin/{}".format(branch.name)
+    try:
+        return any(True for _ in repo.iter_commits("{}..{}".format(upstream, branch)))
+    except GitCommandError:  # the branch is not pushed yet
+        return True
 
 
 def git_sync(dir: str, action: str = "pull"):
@@ -217,10 +268,40 @@ def git_sync(dir: str, action: str = "pull"):
                 logger.info("git {} {}".format(action, dir))
 
 
-if __name__ == "__main__":
+def get_opt():
+    parser = argparse.ArgumentParser(description="Update the data and the website")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="run the pipeline even if MD gov database has no new day",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="also publish a gzip compressed copy of the dashboard (COVID.html.gz)",
+    )
+    return parser.parse_args()
+
 
+def has_new_day():
+    """
+    is there a day in MD gov database after the latest tsv file?
+    (True if the database can't be reached, so the pipeline reports the error)
+    """
+    try:
+        return bool(upstream_new_dates(WORKING_DIR / "data"))
+    except COVIDerror as e:
+        logger.warning("Failed checking for new days: {}".format(e))
+        return True
+
+
+if __name__ == "__main__":
+    args = get_opt()
+    if not args.force and not has_new_day():
+        logger.info("No new day in MD gov database, nothing to update")
+        sys.exit(0)
     luigi.build(
-        [PushWebSite(force=True)],
+        [PushWebSite(force=True, compress=args.compress)],
         local_scheduler=True,
         log_level="INFO",
         workers=1,